@@ -1,15 +1,15 @@
 import discord
 from discord.ext import commands
-from discord.commands import SlashCommandGroup
+from discord.commands import SlashCommandGroup, option
 from utils.logger import get_logger
-from utils.DatabaseManager import DatabaseManager
+from utils.RoleMentions import parse_roles
 
 logger = get_logger("autorole")
 
 class AutoRole(commands.Cog):
     def __init__(self, bot: discord.Bot):
         self.bot = bot
-        self.db = DatabaseManager("database/autorole.db")
+        self.db = bot.db
         bot.loop.create_task(self.db.setup())
 
     def is_bot_managed_role(self, role: discord.Role) -> bool:
@@ -48,20 +48,25 @@ class AutoRole(commands.Cog):
 
         return True
 
-    async def add_autorole(self, ctx: discord.ApplicationContext, role: discord.Role):
+    async def add_autoroles(self, ctx: discord.ApplicationContext, roles: list[discord.Role]):
         try:
-            is_new = await self.db.add_autorole(ctx.guild.id, role.id, ctx.author.id)
+            added_ids = await self.db.autoroles.add_many(ctx.guild.id, [role.id for role in roles], ctx.author.id)
+            added = [role for role in roles if role.id in added_ids]
+            existing = [role for role in roles if role.id not in added_ids]
 
-            if not is_new:
+            if not added:
                 embed = discord.Embed(
                     title="EzRoles - Autorole",
-                    description=f"{role.mention} is already in the autorole list.",
+                    description=f"{', '.join(role.mention for role in existing)} {'is' if len(existing) == 1 else 'are'} already in the autorole list.",
                     color=discord.Color.yellow()
                 )
             else:
+                description = f"{', '.join(role.mention for role in added)} {'has' if len(added) == 1 else 'have'} been added to the autorole list."
+                if existing:
+                    description += f"\nAlready in the list: {', '.join(role.mention for role in existing)}"
                 embed = discord.Embed(
                     title="EzRoles - Autorole",
-                    description=f"{role.mention} has been added to the autorole list.",
+                    description=description,
                     color=discord.Color.green()
                 )
 
@@ -69,7 +74,7 @@ class AutoRole(commands.Cog):
             return embed
 
         except Exception as e:
-            logger.error(f"Error adding role: {e}")
+            logger.error(f"Error adding roles: {e}")
             embed = discord.Embed(
                 title="EzRoles - Error",
                 description="An error occurred. Please try again later.",
@@ -80,24 +85,39 @@ class AutoRole(commands.Cog):
 
     autorole = SlashCommandGroup("autorole", "Manage autoroles.", default_member_permissions=discord.Permissions(administrator=True))
 
-    @autorole.command(name="add", description="Add a role to the autorole list.")
+    @autorole.command(name="add", description="Add one or more roles to the autorole list.")
     @discord.default_permissions(manage_roles=True)
-    async def add(self, ctx: discord.ApplicationContext, role: discord.Role):
-        if not await self.check_role_hierarchy(ctx, role):
+    @option("additional_roles", description="More roles to add at once, as mentions or IDs separated by spaces.", required=False)
+    async def add(self, ctx: discord.ApplicationContext, role: discord.Role, additional_roles: str = None):
+        extra_roles, unknown = parse_roles(ctx.guild, additional_roles)
+        if unknown:
+            embed = discord.Embed(
+                title="EzRoles - Error",
+                description=f"I could not find these roles: {', '.join(unknown)}",
+                color=discord.Color.red()
+            )
+            embed.set_footer(text="Made by EzRoles.xyz")
+            await ctx.respond(embed=embed, ephemeral=True)
             return
 
+        roles = [role] + [extra_role for extra_role in extra_roles if extra_role != role]
+        for checked_role in roles:
+            if not await self.check_role_hierarchy(ctx, checked_role):
+                return
+
         critical_permissions = [
             'administrator', 'ban_members', 'kick_members', 'manage_channels',
             'manage_guild', 'manage_messages', 'manage_roles', 'manage_webhooks',
             'moderate_members'
         ]
         
-        has_critical_perms = any(getattr(role.permissions, perm) for perm in critical_permissions)
+        critical_roles = [r for r in roles if any(getattr(r.permissions, perm) for perm in critical_permissions)]
         
-        if has_critical_perms:
+        if critical_roles:
+            mentions = ', '.join(r.mention for r in critical_roles)
             embed = discord.Embed(
                 title="EzRoles - Warning",
-                description=f"⚠️ {role.mention} has moderation or admin permissions. Are you sure you want to add it as an autorole? New members will automatically receive these permissions.",
+                description=f"⚠️ {mentions} {'has' if len(critical_roles) == 1 else 'have'} moderation or admin permissions. Are you sure you want to add {'it' if len(critical_roles) == 1 else 'them'} as an autorole? New members will automatically receive these permissions.",
                 color=discord.Color.yellow()
             )
             embed.set_footer(text="Made by EzRoles.xyz")
@@ -121,17 +141,17 @@ class AutoRole(commands.Cog):
                 ), view=None)
                 return
             
-            response_message = await self.add_autorole(ctx, role)
+            response_message = await self.add_autoroles(ctx, roles)
             await ctx.edit(embed=response_message, view=None)
         else:
-            response_message = await self.add_autorole(ctx, role)
+            response_message = await self.add_autoroles(ctx, roles)
             await ctx.respond(embed=response_message, ephemeral=True)
 
     @autorole.command(name="remove", description="Remove a role from the autorole list.")
     @discord.default_permissions(manage_roles=True)
     async def remove(self, ctx: discord.ApplicationContext, role: discord.Role):
         try:
-            was_removed = await self.db.remove_autorole(ctx.guild.id, role.id)
+            was_removed = await self.db.autoroles.remove(ctx.guild.id, role.id)
 
             if not was_removed:
                 embed = discord.Embed(
@@ -163,7 +183,7 @@ class AutoRole(commands.Cog):
     @discord.default_permissions(manage_roles=True)
     async def list(self, ctx: discord.ApplicationContext):
         try:
-            role_ids = await self.db.get_autoroles(ctx.guild.id)
+            role_ids = await self.db.autoroles.get(ctx.guild.id)
 
             if not role_ids:
                 description = "No autoroles are set."
@@ -181,7 +201,7 @@ class AutoRole(commands.Cog):
                         valid_role_ids.append(role_id)
 
                 if len(valid_role_ids) < len(role_ids):
-                    await self.db.remove_nonexisting_roles(ctx.guild.id, valid_role_ids)
+                    await self.db.autoroles.remove_nonexisting(ctx.guild.id, valid_role_ids)
 
                 if not role_list:
                     description = "No valid autoroles were found. All outdated entries were removed."
@@ -210,7 +230,7 @@ class AutoRole(commands.Cog):
     @discord.default_permissions(administrator=True)
     async def clear(self, ctx: discord.ApplicationContext):
         try:
-            count = await self.db.clear_autoroles(ctx.guild.id)
+            count = await self.db.autoroles.clear(ctx.guild.id)
 
             embed = discord.Embed(
                 title="EzRoles - Autorole",
@@ -236,33 +256,20 @@ class AutoRole(commands.Cog):
             return
 
         try:
-            role_ids = await self.db.get_autoroles(member.guild.id)
+            role_ids = await self.db.autoroles.get(member.guild.id)
 
             if not role_ids:
                 return
 
-            roles_to_add = []
+            assignable_ids = self.bot.role_index.filter(member.guild, role_ids)
+            roles_to_add = [role for role in map(member.guild.get_role, assignable_ids) if role]
             failed_roles = []
-            valid_role_ids = []
-
-            for role_id in role_ids:
-                role = member.guild.get_role(role_id)
-
-                if not role:
-                    continue
-                
-                if self.is_bot_managed_role(role):
-                    continue
-
-                valid_role_ids.append(role_id)
 
-                if member.guild.me.top_role > role and member.guild.me.guild_permissions.manage_roles:
-                    roles_to_add.append(role)
-                else:
-                    failed_roles.append(role)
-
-            if len(valid_role_ids) < len(role_ids):
-                await self.db.remove_nonexisting_roles(member.guild.id, valid_role_ids)
+            if len(assignable_ids) < len(role_ids):
+                for role_id in role_ids:
+                    role = member.guild.get_role(role_id)
+                    if role and role_id not in assignable_ids and not self.is_bot_managed_role(role):
+                        failed_roles.append(role)
 
             if roles_to_add:
                 try:
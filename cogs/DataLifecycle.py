@@ -0,0 +1,128 @@
+import asyncio
+import discord
+import os
+from datetime import datetime, timedelta, timezone
+from discord.ext import commands, tasks
+from utils.logger import get_logger
+
+logger = get_logger("lifecycle")
+
+class DataLifecycle(commands.Cog):
+    def __init__(self, bot: discord.Bot):
+        self.bot = bot
+        self.db = bot.db
+        self.purge_grace = timedelta(hours=float(os.getenv("PURGE_GRACE_HOURS", "72")))
+        self.sticky_ttl_days = float(os.getenv("STICKY_TTL_DAYS", "365"))
+        self.vacuum_pages = int(os.getenv("VACUUM_PAGES_PER_SLICE", "256"))
+        self.scanned_left_guilds = False
+        self.lifecycle_check.start()
+        self.vacuum_step.start()
+
+    def cog_unload(self):
+        self.lifecycle_check.cancel()
+        self.vacuum_step.cancel()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        try:
+            purge_after = datetime.now(timezone.utc) + self.purge_grace
+            if await self.db.guilds.schedule_purge(guild.id, purge_after):
+                logger.info(f"Scheduled data purge for guild {guild.id} at {purge_after:%Y-%m-%d %H:%M} UTC")
+        except Exception as e:
+            logger.error(f"Error scheduling data purge for guild {guild.id}: {e}")
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        try:
+            if await self.db.guilds.cancel_purge(guild.id):
+                logger.info(f"Cancelled scheduled data purge for guild {guild.id}")
+        except Exception as e:
+            logger.error(f"Error cancelling data purge for guild {guild.id}: {e}")
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        try:
+            removed = await self.db.guilds.remove_roles(role.guild.id, [role.id])
+            if any(removed.values()):
+                logger.info(f"Removed deleted role {role.id} from guild {role.guild.id}: {removed}")
+        except Exception as e:
+            logger.error(f"Error removing deleted role {role.id} for guild {role.guild.id}: {e}")
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild):
+        try:
+            configured = set(await self.db.autoroles.get(guild.id))
+            configured.update(mapping['role_id'] for mapping in await self.db.statusroles.get(guild.id))
+            deleted = [role_id for role_id in configured if guild.get_role(role_id) is None]
+
+            if deleted:
+                removed = await self.db.guilds.remove_roles(guild.id, deleted)
+                logger.info(f"Removed {len(deleted)} roles deleted while offline from guild {guild.id}: {removed}")
+        except Exception as e:
+            logger.error(f"Error removing deleted roles for guild {guild.id}: {e}")
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self.scanned_left_guilds:
+            return
+        self.scanned_left_guilds = True
+
+        try:
+            current_guild_ids = {guild.id for guild in self.bot.guilds}
+            left_guild_ids = await self.db.guilds.known_guild_ids() - current_guild_ids
+            purge_after = datetime.now(timezone.utc) + self.purge_grace
+
+            for guild_id in left_guild_ids:
+                await self.db.guilds.schedule_purge(guild_id, purge_after)
+
+            if left_guild_ids:
+                logger.info(f"Scheduled data purge for {len(left_guild_ids)} guilds the bot is no longer in")
+        except Exception as e:
+            logger.error(f"Error scanning for data of left guilds: {e}")
+
+    @tasks.loop(minutes=10)
+    async def lifecycle_check(self):
+        try:
+            for guild_id in await self.db.guilds.due_purges(datetime.now(timezone.utc)):
+                if self.bot.get_guild(guild_id):
+                    await self.db.guilds.cancel_purge(guild_id)
+                    continue
+
+                deleted = await self.db.guilds.purge(guild_id)
+                logger.info(f"Purged {deleted} rows for guild {guild_id}")
+                await asyncio.sleep(0)
+
+            if self.sticky_ttl_days > 0:
+                cutoff = datetime.now(timezone.utc) - timedelta(days=self.sticky_ttl_days)
+                expired = await self.db.stickyroles.expire_member_roles(cutoff)
+                if expired:
+                    logger.info(f"Expired {expired} sticky role entries older than {self.sticky_ttl_days:g} days")
+
+            await self.db.stickyroles.collect_unused_role_sets()
+
+            if self.db.stickyroles.member_filter_needs_rebuild():
+                await self.db.stickyroles.rebuild_member_filter()
+
+        except Exception as e:
+            logger.error(f"Error in lifecycle_check task: {e}")
+
+    @lifecycle_check.before_loop
+    async def before_lifecycle_check(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=30)
+    async def vacuum_step(self):
+        try:
+            for shard in range(self.db.shards):
+                if await self.db.freelist_count(shard) > 0:
+                    await self.db.incremental_vacuum(shard, self.vacuum_pages)
+                await asyncio.sleep(0)
+        except Exception as e:
+            logger.error(f"Error in vacuum_step task: {e}")
+
+    @vacuum_step.before_loop
+    async def before_vacuum_step(self):
+        await self.bot.wait_until_ready()
+
+def setup(bot: discord.Bot):
+    bot.add_cog(DataLifecycle(bot))
@@ -159,7 +159,7 @@ class CategorySelect(discord.ui.Select):
                 value="🔹 *Remove all status role mappings for this server (admin only).*", inline=False)
             embed.add_field(
                 name="ℹ️ How it works",
-                value="The bot checks members' custom status every 10 minutes and when their status changes. If the status contains the configured text (case insensitive), the role will be assigned.", 
+                value="The bot reacts when a member's custom status changes and applies the roles once the status has stayed the same for a few seconds. If the status contains the configured text (case insensitive), the role will be assigned. Roles are kept for a few minutes after a member goes offline, and an hourly check, more frequent in servers where roles drift, catches manual role edits.", 
                 inline=False)
 
         embed.set_footer(text="Made by EzRoles.xyz")
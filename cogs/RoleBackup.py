@@ -1,15 +1,14 @@
 import discord
 from discord.ext import commands
-from discord.commands import SlashCommandGroup
+from discord.commands import SlashCommandGroup, option
 from utils.logger import get_logger
-from utils.DatabaseManager import DatabaseManager
 
 
 class RoleBackup(commands.Cog):
     def __init__(self, bot: discord.Bot):
         self.bot = bot
         self.logger = get_logger("RoleBackup")
-        self.db = DatabaseManager("database/rolebackup.db")
+        self.db = bot.db
 
     def is_bot_managed_role(self, role: discord.Role) -> bool:
         return role.tags is not None and role.tags.is_bot_managed()
@@ -23,12 +22,13 @@ class RoleBackup(commands.Cog):
     @backup.command(name="create", description="Create a backup of the current roles.")
     @discord.default_permissions(administrator=True)
     async def create_backup(self, ctx: discord.ApplicationContext):
-        existing_backup = await self.db.get_role_backup(ctx.guild.id)
+        retention = self.db.backups.retention
+        existing_backup = await self.db.backups.count(ctx.guild.id) >= retention
         
         if existing_backup:
             embed = discord.Embed(
                 title="EzRoles - Role Backup",
-                description="A backup already exists for this server. Would you like to overwrite it?",
+                description=f"This server already has {retention} backups. Creating a new one will delete the oldest backup. Do you want to continue?",
                 color=discord.Color.yellow()
             )
             embed.set_footer(text="Made by EzRoles.xyz")
@@ -71,12 +71,12 @@ class RoleBackup(commands.Cog):
             }
             roles_data.append(role_data)
         
-        success = await self.db.save_role_backup(ctx.guild.id, ctx.author.id, roles_data)
+        snapshot_id = await self.db.backups.save(ctx.guild.id, ctx.author.id, roles_data)
         
-        if success:
+        if snapshot_id:
             embed = discord.Embed(
                 title="EzRoles - Role Backup",
-                description=f"Backup created successfully with {len(roles_data)} roles! (Bot roles excluded)",
+                description=f"Backup #{snapshot_id} created successfully with {len(roles_data)} roles! (Bot roles excluded)",
                 color=discord.Color.green()
             )
         else:
@@ -95,13 +95,14 @@ class RoleBackup(commands.Cog):
     
     @backup.command(name="restore", description="Restore roles from a backup.")
     @discord.default_permissions(administrator=True)
-    async def restore_backup(self, ctx: discord.ApplicationContext):
-        backup_data = await self.db.get_role_backup(ctx.guild.id)
+    @option("backup_id", description="The backup to restore. Defaults to the latest backup.", required=False)
+    async def restore_backup(self, ctx: discord.ApplicationContext, backup_id: int = None):
+        backup_data = await self.db.backups.get(ctx.guild.id, backup_id)
         
         if not backup_data:
             embed = discord.Embed(
                 title="EzRoles - Role Backup",
-                description="No backup found for this server.",
+                description="No matching backup found for this server.",
                 color=discord.Color.red()
             )
             embed.set_footer(text="Made by EzRoles.xyz")
@@ -111,7 +112,7 @@ class RoleBackup(commands.Cog):
         embed = discord.Embed(
             title="EzRoles - Role Backup",
             description=(
-                f"Are you sure you want to restore {len(backup_data['roles'])} roles from the backup?\n"
+                f"Are you sure you want to restore {len(backup_data['roles'])} roles from backup #{backup_data['snapshot_id']}?\n"
                 f"⚠️ The bot can only restore roles that are **below its highest role** and **within its permission scope**."
             ),
             color=discord.Color.yellow()
@@ -220,13 +221,14 @@ class RoleBackup(commands.Cog):
         
     @backup.command(name="delete", description="Delete a backup.")
     @discord.default_permissions(administrator=True)
-    async def delete_backup(self, ctx: discord.ApplicationContext):
-        backup_exists = await self.db.backup_exists(ctx.guild.id)
+    @option("backup_id", description="The backup to delete. Deletes all backups if omitted.", required=False)
+    async def delete_backup(self, ctx: discord.ApplicationContext, backup_id: int = None):
+        backup_exists = await self.db.backups.exists(ctx.guild.id, backup_id)
         
         if not backup_exists:
             embed = discord.Embed(
                 title="EzRoles - Role Backup",
-                description="No backup found for this server.",
+                description="No matching backup found for this server.",
                 color=discord.Color.red()
             )
             embed.set_footer(text="Made by EzRoles.xyz")
@@ -235,7 +237,11 @@ class RoleBackup(commands.Cog):
         
         embed = discord.Embed(
             title="EzRoles - Role Backup",
-            description="Are you sure you want to delete the backup for this server? This action cannot be undone.",
+            description=(
+                f"Are you sure you want to delete backup #{backup_id}? This action cannot be undone."
+                if backup_id is not None else
+                "Are you sure you want to delete all backups for this server? This action cannot be undone."
+            ),
             color=discord.Color.yellow()
         )
         embed.set_footer(text="Made by EzRoles.xyz")
@@ -259,7 +265,7 @@ class RoleBackup(commands.Cog):
             ), view=None)
             return
         
-        success = await self.db.delete_role_backup(ctx.guild.id)
+        success = await self.db.backups.delete(ctx.guild.id, backup_id)
         
         if success:
             embed = discord.Embed(
@@ -278,15 +284,37 @@ class RoleBackup(commands.Cog):
         embed.set_footer(text="Made by EzRoles.xyz")
         await ctx.edit(embed=embed, view=None)
     
+    @backup.command(name="list", description="List all stored backups.")
+    @discord.default_permissions(administrator=True)
+    async def list_backups(self, ctx: discord.ApplicationContext):
+        snapshots = await self.db.backups.list_snapshots(ctx.guild.id)
+        
+        if not snapshots:
+            description = "No backup found for this server."
+        else:
+            description = "\n".join(
+                f"**#{snapshot['snapshot_id']}** - {snapshot['role_count']} roles, created {snapshot['created_at']} by <@{snapshot['created_by']}>"
+                for snapshot in snapshots
+            )
+        
+        embed = discord.Embed(
+            title="EzRoles - Role Backup",
+            description=description,
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text=f"Made by EzRoles.xyz - Keeping the latest {self.db.backups.retention} backups")
+        await ctx.respond(embed=embed, ephemeral=True)
+    
     @backup.command(name="show", description="Show all roles in my backup.")
     @discord.default_permissions(administrator=True)
-    async def show_backups(self, ctx: discord.ApplicationContext):
-        backup_data = await self.db.get_role_backup(ctx.guild.id)
+    @option("backup_id", description="The backup to show. Defaults to the latest backup.", required=False)
+    async def show_backups(self, ctx: discord.ApplicationContext, backup_id: int = None):
+        backup_data = await self.db.backups.get(ctx.guild.id, backup_id)
         
         if not backup_data:
             embed = discord.Embed(
                 title="EzRoles - Role Backup",
-                description="No backup found for this server.",
+                description="No matching backup found for this server.",
                 color=discord.Color.red()
             )
             embed.set_footer(text="Made by EzRoles.xyz")
@@ -303,6 +331,7 @@ class RoleBackup(commands.Cog):
             color=discord.Color.blue()
         )
         
+        embed.add_field(name="Backup", value=f"#{backup_data['snapshot_id']}", inline=True)
         embed.add_field(name="Created By", value=created_by, inline=True)
         embed.add_field(name="Created At", value=timestamp, inline=True)
         embed.add_field(name="Total Roles", value=str(len(roles)), inline=True)
@@ -1,20 +1,52 @@
+import asyncio
+import os
+import time
+from collections import deque
 import discord
 from discord.ext import commands, tasks
-from discord.commands import SlashCommandGroup
+from discord.commands import SlashCommandGroup, option
 from utils.logger import get_logger
-from utils.DatabaseManager import DatabaseManager
+from utils.PresenceQueue import PresenceQueue
+from utils.RoleMentions import parse_roles
+from utils.StatusState import GuildStatusState, StatusState
+from utils.SweepScheduler import SweepScheduler
+
+# Members verified between yields to the event loop during a sweep.
+SWEEP_BATCH_SIZE = 500
 
 logger = get_logger("statusrole")
 
 class StatusRole(commands.Cog):
     def __init__(self, bot: discord.Bot):
         self.bot = bot
-        self.db = DatabaseManager("database/statusrole.db")
+        self.db = bot.db
+        self.states = StatusState()
+        self.debounce = float(os.getenv("STATUS_DEBOUNCE_SECONDS", "5"))
+        self.offline_grace = float(os.getenv("STATUS_OFFLINE_GRACE_SECONDS", "300"))
+        self.reconcile_event = asyncio.Event()
+        self.reconciling = {}
+        self.reconcile_tasks = set()
+        self.sweeping = set()
+        self.shed_members = {}
+        self.role_slots = asyncio.Semaphore(int(os.getenv("STATUS_ROLE_CONCURRENCY", "4")))
+        self.sweep_slots = asyncio.Semaphore(int(os.getenv("STATUS_SWEEP_CONCURRENCY", "2")))
+        self.sweeps = SweepScheduler(float(os.getenv("STATUS_SWEEP_INTERVAL", "3600")))
         bot.loop.create_task(self.db.setup())
+        self.reconciler = bot.loop.create_task(self.reconcile_loop())
+        self.presence_queue = PresenceQueue(int(os.getenv("PRESENCE_QUEUE_SIZE", "10000")))
+        self.presence_workers = [bot.loop.create_task(self.presence_worker()) for _ in range(int(os.getenv("PRESENCE_WORKERS", "4")))]
+        self.db.metrics.add_gauges("presence_queue", self.presence_queue.stats)
+        self.db.metrics.add_gauges("status_state", self.states.stats)
+        self.db.metrics.add_gauges("status_sweep", self.sweeps.stats)
         self.status_check.start()
     
     def cog_unload(self):
         self.status_check.cancel()
+        self.reconciler.cancel()
+        for task in [*self.reconcile_tasks, *self.sweeping]:
+            task.cancel()
+        for worker in self.presence_workers:
+            worker.cancel()
     
     def is_bot_managed_role(self, role: discord.Role) -> bool:
         return role.tags is not None and role.tags.is_bot_managed()
@@ -52,20 +84,27 @@ class StatusRole(commands.Cog):
 
         return True
 
-    async def add_status_role_mapping(self, ctx: discord.ApplicationContext, role: discord.Role, status_text: str):
+    async def add_status_role_mappings(self, ctx: discord.ApplicationContext, roles: list[discord.Role], status_text: str):
         try:
-            is_new = await self.db.add_statusrole(ctx.guild.id, role.id, status_text, ctx.author.id)
+            added_ids = await self.db.statusroles.add_many(ctx.guild.id, [role.id for role in roles], status_text, ctx.author.id)
+            added = [role for role in roles if role.id in added_ids]
+            if added:
+                self.request_refresh(ctx.guild)
+            existing = [role for role in roles if role.id not in added_ids]
 
-            if not is_new:
+            if not added:
                 embed = discord.Embed(
                     title="EzRoles - StatusRole",
-                    description=f"{role.mention} is already configured with this status text.",
+                    description=f"{', '.join(role.mention for role in existing)} {'is' if len(existing) == 1 else 'are'} already configured with this status text.",
                     color=discord.Color.yellow()
                 )
             else:
+                description = f"{', '.join(role.mention for role in added)} will now be assigned to members with \"{status_text}\" in their custom status."
+                if existing:
+                    description += f"\nAlready configured: {', '.join(role.mention for role in existing)}"
                 embed = discord.Embed(
                     title="EzRoles - StatusRole",
-                    description=f"{role.mention} will now be assigned to members with \"{status_text}\" in their custom status.",
+                    description=description,
                     color=discord.Color.green()
                 )
 
@@ -73,7 +112,7 @@ class StatusRole(commands.Cog):
             return embed
 
         except Exception as e:
-            logger.error(f"Error adding status role: {e}")
+            logger.error(f"Error adding status roles: {e}")
             embed = discord.Embed(
                 title="EzRoles - Error",
                 description="An error occurred. Please try again later.",
@@ -82,67 +121,195 @@ class StatusRole(commands.Cog):
             embed.set_footer(text="Made by EzRoles.xyz")
             return embed
 
-    @tasks.loop(minutes=10)
-    async def status_check(self):
+    def member_status(self, member: discord.Member) -> str | None:
+        for activity in member.activities:
+            if isinstance(activity, discord.CustomActivity) and activity.state:
+                return activity.state
+        return None
+
+    async def verify_status_state(self, guild: discord.Guild, state: GuildStatusState) -> int:
+        tracker = self.bot.member_tracker
+        assignable = self.bot.role_index.assignable_ids(guild)
+        prime = not state.primed
+        state.primed = True
+        drifted = 0
+        
+        if tracker is not None:
+            if prime:
+                for user_id, status in tracker.guild_statuses(guild.id).items():
+                    state.update(user_id, status)
+            
+            members = tracker.guild_members(guild.id)
+            # Members with a matching status but unknown roles only ever get roles added.
+            for index, user_id in enumerate(set(members).union(state.matches), 1):
+                drifted += state.needs_reconcile(user_id, members.get(user_id), assignable)
+                if index % SWEEP_BATCH_SIZE == 0:
+                    await asyncio.sleep(0)
+        else:
+            for index, member in enumerate(guild.members, 1):
+                if not member.bot:
+                    if prime:
+                        state.update(member.id, self.member_status(member))
+                    drifted += state.needs_reconcile(member.id, [role.id for role in member.roles], assignable)
+                if index % SWEEP_BATCH_SIZE == 0:
+                    await asyncio.sleep(0)
+        
+        return drifted
+
+    async def apply_status_roles(self, guild: discord.Guild, user_id: int, current_role_ids, state: GuildStatusState):
+        assignable = self.bot.role_index.assignable_ids(guild)
+        tracker = self.bot.member_tracker
+        to_add, to_remove = state.diff(user_id, current_role_ids)
+        
+        for role_id in to_add & assignable:
+            try:
+                await self.bot.http.add_role(guild.id, user_id, role_id, reason="StatusRole - Status matches criteria")
+                if tracker is not None:
+                    tracker.add_role(guild.id, user_id, role_id)
+            except discord.Forbidden:
+                logger.error(f"No permission to add role {role_id} to member {user_id}")
+            except Exception as e:
+                logger.error(f"Error adding role {role_id} to member {user_id}: {e}")
+        
+        for role_id in to_remove & assignable:
+            try:
+                await self.bot.http.remove_role(guild.id, user_id, role_id, reason="StatusRole - Status no longer matches")
+                if tracker is not None:
+                    tracker.remove_role(guild.id, user_id, role_id)
+            except discord.Forbidden:
+                logger.error(f"No permission to remove role {role_id} from member {user_id}")
+            except Exception as e:
+                logger.error(f"Error removing role {role_id} from member {user_id}: {e}")
+
+    async def reconcile_loop(self):
+        await self.bot.wait_until_ready()
+        
+        while True:
+            next_due = self.states.next_due()
+            try:
+                timeout = None if next_due is None else max(0, next_due - time.monotonic())
+                await asyncio.wait_for(self.reconcile_event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.reconcile_event.clear()
+            
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"Error reconciling status roles: {e}")
+
+    def reconcile(self):
+        for guild_id, due in self.states.take_due(time.monotonic()).items():
+            # One task per guild keeps each guild's role changes sequential; members due meanwhile join its queue.
+            queued = self.reconciling.get(guild_id)
+            if queued is not None:
+                queued.extend(due)
+                continue
+            
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                state = self.states.get(guild_id)
+                for user_id, due_at in due:
+                    state.claim(user_id, due_at)
+                continue
+            
+            queued = self.reconciling[guild_id] = deque(due)
+            task = asyncio.create_task(self.reconcile_guild(guild, queued))
+            self.reconcile_tasks.add(task)
+            task.add_done_callback(self.reconcile_tasks.discard)
+
+    async def reconcile_guild(self, guild: discord.Guild, due: deque):
+        tracker = self.bot.member_tracker
+        
         try:
-            for guild in self.bot.guilds:
-                status_roles = await self.db.get_statusroles(guild.id)
-                
-                if not status_roles:
+            while due:
+                user_id, due_at = due.popleft()
+                # Looked up per member, since the mappings may be replaced while this runs.
+                state = self.states.get(guild.id)
+                if state is None or not state.is_due(user_id, due_at):
                     continue
                 
-                valid_role_ids = []
-                mappings = []
-                
-                for mapping in status_roles:
-                    role_id, status_text = mapping['role_id'], mapping['status_text']
-                    role = guild.get_role(role_id)
+                try:
+                    if tracker is not None:
+                        role_ids = tracker.get_roles(guild.id, user_id)
+                    else:
+                        member = guild.get_member(user_id)
+                        if member is None:
+                            continue
+                        role_ids = [role.id for role in member.roles]
                     
-                    if role and not self.is_bot_managed_role(role):
-                        valid_role_ids.append(role_id)
-                        mappings.append({
-                            'role': role,
-                            'status_text': status_text
-                        })
-                
-                if len(valid_role_ids) < len(status_roles):
-                    await self.db.remove_nonexisting_statusroles(guild.id, valid_role_ids)
-                
-                if not mappings:
-                    continue
-                
-                for member in guild.members:
-                    if member.bot:
-                        continue
-                    
-                    for mapping in mappings:
-                        role = mapping['role']
-                        status_text = mapping['status_text'].lower()
-                        
-                        has_status = any(
-                            isinstance(activity, discord.CustomActivity) and 
-                            activity.state and 
-                            status_text in activity.state.lower()
-                            for activity in member.activities
-                        )
-                        
-                        if has_status and role not in member.roles:
-                            if guild.me.top_role > role and guild.me.guild_permissions.manage_roles:
-                                try:
-                                    await member.add_roles(role, reason="StatusRole - Status matches criteria")
-                                except discord.Forbidden:
-                                    logger.error(f"No permission to add role {role.name} to {member.display_name}")
-                                except Exception as e:
-                                    logger.error(f"Error adding role {role.name} to {member.display_name}: {e}")
-                        
-                        elif not has_status and role in member.roles:
-                            if guild.me.top_role > role and guild.me.guild_permissions.manage_roles:
-                                try:
-                                    await member.remove_roles(role, reason="StatusRole - Status no longer matches")
-                                except discord.Forbidden:
-                                    logger.error(f"No permission to remove role {role.name} from {member.display_name}")
-                                except Exception as e:
-                                    logger.error(f"Error removing role {role.name} from {member.display_name}: {e}")
+                    async with self.role_slots:
+                        await self.apply_status_roles(guild, user_id, role_ids, state)
+                finally:
+                    # Still dirty while its roles change, so a sweep meanwhile does not count it as drift.
+                    state.claim(user_id, due_at)
+        
+        except Exception as e:
+            logger.error(f"Error reconciling status roles for guild {guild.id}: {e}")
+        
+        finally:
+            # Members left behind by an error are picked up again by the next sweep.
+            left = self.reconciling.pop(guild.id)
+            state = self.states.get(guild.id)
+            if state is not None:
+                for user_id, due_at in left:
+                    state.claim(user_id, due_at)
+
+    async def refresh_guild(self, guild: discord.Guild) -> int:
+        status_roles = await self.db.statusroles.get(guild.id)
+        
+        if not status_roles:
+            self.states.drop(guild.id)
+            return 0
+        
+        self.bot.member_chunker.request(guild)
+        
+        state = self.states.guild(guild.id, status_roles)
+        if not state.mapped_role_ids & self.bot.role_index.assignable_ids(guild):
+            return 0
+        
+        self.rederive_shed_members(guild.id)
+        drifted = await self.verify_status_state(guild, state)
+        if state.dirty:
+            self.reconcile_event.set()
+        return drifted
+
+    def request_refresh(self, guild: discord.Guild):
+        # Verifying walks every member, so configuration changes wait for the next sweep tick instead of the interaction.
+        self.sweeps.request(guild.id, time.monotonic())
+
+    async def sweep_guild(self, guild_id: int):
+        drifted = 0
+        
+        try:
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                self.sweeps.forget(guild_id)
+                return
+            
+            async with self.sweep_slots:
+                drifted = await self.refresh_guild(guild)
+        
+        except Exception as e:
+            logger.error(f"Error sweeping status roles for guild {guild_id}: {e}")
+        
+        finally:
+            if guild_id in self.sweeps:
+                self.sweeps.done(guild_id, time.monotonic(), drifted)
+
+    @tasks.loop(seconds=30)
+    async def status_check(self):
+        # Presence events keep the state current; sweeps only catch drift such as manual role edits.
+        try:
+            now = time.monotonic()
+            for guild in self.bot.guilds:
+                if guild.id not in self.sweeps:
+                    self.sweeps.add(guild.id, now)
+            
+            for guild_id in self.sweeps.take_due(now):
+                task = asyncio.create_task(self.sweep_guild(guild_id))
+                self.sweeping.add(task)
+                task.add_done_callback(self.sweeping.discard)
         
         except Exception as e:
             logger.error(f"Error in status_check task: {e}")
@@ -151,69 +318,141 @@ class StatusRole(commands.Cog):
     async def before_status_check(self):
         await self.bot.wait_until_ready()
     
+    def enqueue_presence(self, guild_id: int, user_id: int, status: str | None, offline: bool):
+        shed = self.presence_queue.put(guild_id, user_id, (status, offline))
+        if shed is not None:
+            # The dropped update is re-read from the cache once the queue has room, instead of re-priming the whole guild.
+            shed_guild_id, shed_user_id = shed
+            self.shed_members.setdefault(shed_guild_id, set()).add(shed_user_id)
+
+    def rederive_shed_members(self, guild_id: int | None = None):
+        tracker = self.bot.member_tracker
+        
+        for guild_id in list(self.shed_members) if guild_id is None else [guild_id]:
+            user_ids = self.shed_members.pop(guild_id, None)
+            state = self.states.get(guild_id)
+            guild = self.bot.get_guild(guild_id)
+            # An unprimed guild reads every current presence when it is primed anyway.
+            if not user_ids or state is None or not state.primed or guild is None:
+                continue
+            
+            for user_id in user_ids:
+                if tracker is not None:
+                    status = tracker.get_status(guild_id, user_id)
+                else:
+                    member = guild.get_member(user_id)
+                    if member is None:
+                        continue
+                    status = self.member_status(member)
+                # The dropped event may have been the member going offline, so a lost status waits out the grace period.
+                state.update(user_id, status, self.debounce if status else self.offline_grace)
+            
+            if state.dirty:
+                self.reconcile_event.set()
+
+    async def presence_worker(self):
+        while True:
+            guild_id, user_id, (status, offline) = await self.presence_queue.get()
+            
+            try:
+                await self.process_presence(guild_id, user_id, status, offline)
+                if self.shed_members and not self.presence_queue.size:
+                    self.rederive_shed_members()
+            except Exception as e:
+                logger.error(f"Error processing presence update: {e}")
+
+    async def process_presence(self, guild_id: int, user_id: int, status: str | None, offline: bool):
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return
+        
+        status_roles = await self.db.statusroles.get(guild_id)
+        
+        if not status_roles:
+            return
+        
+        if self.bot.member_tracker is not None:
+            self.bot.member_tracker.set_status(guild_id, user_id, status)
+        
+        state = self.states.guild(guild_id, status_roles)
+        if not state.primed:
+            await self.verify_status_state(guild, state)
+        else:
+            # Going offline clears activities; wait out the grace period before that removes roles.
+            state.update(user_id, status, self.offline_grace if offline else self.debounce)
+        
+        if state.dirty:
+            self.reconcile_event.set()
+
     @commands.Cog.listener()
     async def on_presence_update(self, before: discord.Member, after: discord.Member):
-        if before.activities == after.activities:
+        if before.activities == after.activities or after.bot:
             return
         
-        try:
-            guild = after.guild
-            status_roles = await self.db.get_statusroles(guild.id)
-            
-            if not status_roles:
-                return
-            
-            for mapping in status_roles:
-                role_id, status_text = mapping['role_id'], mapping['status_text']
-                role = guild.get_role(role_id)
-                
-                if not role or self.is_bot_managed_role(role):
-                    continue
-                
-                has_status = any(
-                    isinstance(activity, discord.CustomActivity) and 
-                    activity.state and 
-                    status_text.lower() in activity.state.lower()
-                    for activity in after.activities
-                )
-                
-                if has_status and role not in after.roles:
-                    if guild.me.top_role > role and guild.me.guild_permissions.manage_roles:
-                        try:
-                            await after.add_roles(role, reason="StatusRole - Status matches criteria")
-                        except Exception as e:
-                            logger.error(f"Error adding role {role.name} to {after.display_name}: {e}")
-                
-                elif not has_status and role in after.roles:
-                    if guild.me.top_role > role and guild.me.guild_permissions.manage_roles:
-                        try:
-                            await after.remove_roles(role, reason="StatusRole - Status no longer matches")
-                        except Exception as e:
-                            logger.error(f"Error removing role {role.name} from {after.display_name}: {e}")
+        self.enqueue_presence(after.guild.id, after.id, self.member_status(after), after.status is discord.Status.offline)
+
+    @commands.Cog.listener()
+    async def on_raw_presence_update(self, guild: discord.Guild, user_id: int, status: str | None, offline: bool):
+        tracker = self.bot.member_tracker
+        if tracker is None or tracker.get_status(guild.id, user_id) == status:
+            return
         
-        except Exception as e:
-            logger.error(f"Error in on_presence_update: {e}")
+        # Record the status right away in guilds with mappings, so a member whose update gets shed is re-derived from it.
+        if self.states.get(guild.id) is not None:
+            tracker.set_status(guild.id, user_id, status)
+        self.enqueue_presence(guild.id, user_id, status, offline)
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        state = self.states.get(payload.guild_id)
+        if state is not None:
+            state.forget(payload.user.id)
+
+    @commands.Cog.listener()
+    async def on_members_chunked(self, guild: discord.Guild):
+        self.states.unprime(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.states.drop(guild.id)
+        self.sweeps.forget(guild.id)
+        self.shed_members.pop(guild.id, None)
 
     statusrole = SlashCommandGroup("statusrole", "Manage status roles.", default_member_permissions=discord.Permissions(administrator=True))
 
-    @statusrole.command(name="add", description="Add a role to be assigned when a specific text appears in users' status.")
+    @statusrole.command(name="add", description="Add roles to be assigned when a specific text appears in users' status.")
     @discord.default_permissions(manage_roles=True)
-    async def add(self, ctx: discord.ApplicationContext, role: discord.Role, status_text: str):
-        if not await self.check_role_hierarchy(ctx, role):
+    @option("additional_roles", description="More roles to add at once, as mentions or IDs separated by spaces.", required=False)
+    async def add(self, ctx: discord.ApplicationContext, role: discord.Role, status_text: str, additional_roles: str = None):
+        extra_roles, unknown = parse_roles(ctx.guild, additional_roles)
+        if unknown:
+            embed = discord.Embed(
+                title="EzRoles - Error",
+                description=f"I could not find these roles: {', '.join(unknown)}",
+                color=discord.Color.red()
+            )
+            embed.set_footer(text="Made by EzRoles.xyz")
+            await ctx.respond(embed=embed, ephemeral=True)
             return
 
+        roles = [role] + [extra_role for extra_role in extra_roles if extra_role != role]
+        for checked_role in roles:
+            if not await self.check_role_hierarchy(ctx, checked_role):
+                return
+
         critical_permissions = [
             'administrator', 'ban_members', 'kick_members', 'manage_channels',
             'manage_guild', 'manage_messages', 'manage_roles', 'manage_webhooks',
             'moderate_members'
         ]
         
-        has_critical_perms = any(getattr(role.permissions, perm) for perm in critical_permissions)
+        critical_roles = [r for r in roles if any(getattr(r.permissions, perm) for perm in critical_permissions)]
         
-        if has_critical_perms:
+        if critical_roles:
+            mentions = ', '.join(r.mention for r in critical_roles)
             embed = discord.Embed(
                 title="EzRoles - Warning",
-                description=f"⚠️ {role.mention} has moderation or admin permissions. Are you sure you want to add it as a status role? Users with \"{status_text}\" in their status will automatically receive these permissions.",
+                description=f"⚠️ {mentions} {'has' if len(critical_roles) == 1 else 'have'} moderation or admin permissions. Are you sure you want to add {'it' if len(critical_roles) == 1 else 'them'} as a status role? Users with \"{status_text}\" in their status will automatically receive these permissions.",
                 color=discord.Color.yellow()
             )
             embed.set_footer(text="Made by EzRoles.xyz")
@@ -237,10 +476,10 @@ class StatusRole(commands.Cog):
                 ), view=None)
                 return
             
-            response_message = await self.add_status_role_mapping(ctx, role, status_text)
+            response_message = await self.add_status_role_mappings(ctx, roles, status_text)
             await ctx.edit(embed=response_message, view=None)
         else:
-            response_message = await self.add_status_role_mapping(ctx, role, status_text)
+            response_message = await self.add_status_role_mappings(ctx, roles, status_text)
             await ctx.respond(embed=response_message, ephemeral=True)
 
     @statusrole.command(name="remove", description="Remove a status role mapping.")
@@ -248,12 +487,15 @@ class StatusRole(commands.Cog):
     async def remove(self, ctx: discord.ApplicationContext, role: discord.Role, status_text: str = None):
         try:
             if status_text:
-                was_removed = await self.db.remove_statusrole(ctx.guild.id, role.id, status_text)
+                was_removed = await self.db.statusroles.remove(ctx.guild.id, role.id, status_text)
                 description = f"Status role mapping for {role.mention} with text \"{status_text}\" has been removed."
             else:
-                was_removed = await self.db.remove_all_statusroles_for_role(ctx.guild.id, role.id)
+                was_removed = await self.db.statusroles.remove_role(ctx.guild.id, role.id)
                 description = f"All status mappings for {role.mention} have been removed."
 
+            if was_removed:
+                self.request_refresh(ctx.guild)
+
             if not was_removed:
                 embed = discord.Embed(
                     title="EzRoles - StatusRole",
@@ -284,7 +526,7 @@ class StatusRole(commands.Cog):
     @discord.default_permissions(manage_roles=True)
     async def list(self, ctx: discord.ApplicationContext):
         try:
-            status_roles = await self.db.get_statusroles(ctx.guild.id)
+            status_roles = await self.db.statusroles.get(ctx.guild.id)
 
             if not status_roles:
                 description = "No status roles are configured."
@@ -301,7 +543,7 @@ class StatusRole(commands.Cog):
                         valid_role_ids.append(role_id)
 
                 if len(valid_role_ids) < len(status_roles):
-                    await self.db.remove_nonexisting_statusroles(ctx.guild.id, valid_role_ids)
+                    await self.db.statusroles.remove_nonexisting(ctx.guild.id, valid_role_ids)
 
                 if not role_mappings:
                     description = "No valid status roles were found. All outdated entries were removed."
@@ -330,7 +572,8 @@ class StatusRole(commands.Cog):
     @discord.default_permissions(administrator=True)
     async def clear(self, ctx: discord.ApplicationContext):
         try:
-            count = await self.db.clear_statusroles(ctx.guild.id)
+            count = await self.db.statusroles.clear(ctx.guild.id)
+            self.states.drop(ctx.guild.id)
 
             embed = discord.Embed(
                 title="EzRoles - StatusRole",
@@ -2,14 +2,13 @@ import discord
 from discord.ext import commands
 from discord.commands import SlashCommandGroup, option
 from utils.logger import get_logger
-from utils.DatabaseManager import DatabaseManager
 
 logger = get_logger("stickyroles")
 
 class StickyRoles(commands.Cog):
     def __init__(self, bot: discord.Bot):
         self.bot = bot
-        self.db = DatabaseManager("database/stickyroles.db")
+        self.db = bot.db
         bot.loop.create_task(self.db.setup())
 
     def is_bot_managed_role(self, role: discord.Role) -> bool:
@@ -24,7 +23,9 @@ class StickyRoles(commands.Cog):
         try:
             enabled = mode == "On"
             
-            result = await self.db.set_feature_status(ctx.guild.id, enabled)
+            result = await self.db.stickyroles.set_feature_status(ctx.guild.id, enabled)
+            if enabled:
+                self.bot.member_chunker.request(ctx.guild)
             
             if result:
                 embed = discord.Embed(
@@ -56,7 +57,7 @@ class StickyRoles(commands.Cog):
     @discord.default_permissions(manage_roles=True)
     async def status(self, ctx: discord.ApplicationContext):
         try:
-            sticky_enabled = await self.db.get_feature_status(ctx.guild.id)
+            sticky_enabled = await self.db.stickyroles.get_feature_status(ctx.guild.id)
 
             color = discord.Color.green() if sticky_enabled else discord.Color.red()
             status_text = "enabled" if sticky_enabled else "disabled"
@@ -79,61 +80,71 @@ class StickyRoles(commands.Cog):
             embed.set_footer(text="Made by EzRoles.xyz")
             await ctx.respond(embed=embed, ephemeral=True)
 
+    async def save_roles(self, guild: discord.Guild, user_id: int, role_ids) -> bool:
+        if not await self.db.stickyroles.get_feature_status(guild.id):
+            return False
+
+        saved_role_ids = []
+        for role_id in role_ids:
+            if role_id == guild.default_role.id:
+                continue
+
+            role = guild.get_role(role_id)
+            if role and self.is_bot_managed_role(role):
+                continue
+
+            saved_role_ids.append(role_id)
+
+        if not saved_role_ids:
+            return False
+
+        return await self.db.stickyroles.save_member_roles(guild.id, user_id, saved_role_ids)
+
     @commands.Cog.listener()
     async def on_member_remove(self, member: discord.Member):
+        if member.bot:
+            return
+
         try:
-            is_enabled = await self.db.get_feature_status(member.guild.id)
-            if not is_enabled:
-                return
-                
-            if member.bot:
-                return
-                
-            role_ids = []
-            for role in member.roles:
-                if role.id != member.guild.default_role.id:
-                    if not self.is_bot_managed_role(role):
-                        role_ids.append(role.id)
-            
-            if not role_ids:
-                return
-                
-            await self.db.save_member_roles(member.guild.id, member.id, role_ids)
-            
+            await self.save_roles(member.guild, member.id, [role.id for role in member.roles])
+        except Exception as e:
+            logger.error(f"Error saving roles for leaving member: {e}")
+
+    @commands.Cog.listener()
+    async def on_tracked_member_remove(self, guild_id: int, user_id: int, role_ids: tuple[int, ...]):
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return
+
+        try:
+            await self.save_roles(guild, user_id, role_ids)
         except Exception as e:
             logger.error(f"Error saving roles for leaving member: {e}")
     
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         try:
-            is_enabled = await self.db.get_feature_status(member.guild.id)
+            is_enabled = await self.db.stickyroles.get_feature_status(member.guild.id)
             if not is_enabled:
                 return
                 
             if member.bot:
                 return
                 
-            role_ids = await self.db.get_member_roles(member.guild.id, member.id)
+            role_ids = await self.db.stickyroles.get_member_roles(member.guild.id, member.id)
             
             if not role_ids:
                 return
                 
-            roles_to_add = []
+            assignable_ids = self.bot.role_index.filter(member.guild, role_ids)
+            roles_to_add = [role for role in map(member.guild.get_role, assignable_ids) if role]
             failed_roles = []
-            
-            for role_id in role_ids:
-                role = member.guild.get_role(role_id)
-                
-                if not role:
-                    continue
-                
-                if self.is_bot_managed_role(role):
-                    continue
-                    
-                if member.guild.me.top_role > role and member.guild.me.guild_permissions.manage_roles:
-                    roles_to_add.append(role)
-                else:
-                    failed_roles.append(role)
+
+            if len(assignable_ids) < len(role_ids):
+                for role_id in role_ids:
+                    role = member.guild.get_role(role_id)
+                    if role and role_id not in assignable_ids and not self.is_bot_managed_role(role):
+                        failed_roles.append(role)
             
             if roles_to_add:
                 try:
@@ -153,7 +164,7 @@ class StickyRoles(commands.Cog):
     @discord.default_permissions(administrator=True)
     async def clear(self, ctx: discord.ApplicationContext):
         try:
-            count = await self.db.clear_sticky_roles(ctx.guild.id)
+            count = await self.db.stickyroles.clear_member_roles(ctx.guild.id)
             
             embed = discord.Embed(
                 title="EzRoles - Sticky Roles",
@@ -2,15 +2,51 @@ import discord
 import os
 from dotenv import load_dotenv
 from utils.logger import get_logger
+from utils.DatabaseManager import DatabaseManager
+from utils.MemberChunker import MemberChunker
+from utils.MemberTracker import MemberRoleTracker
+from utils.RoleIndex import RoleIndex
 
 logger = get_logger("EzRoles")
 
 load_dotenv()
 
-bot = discord.Bot(
+LOW_MEMORY_MODE = os.getenv("LOW_MEMORY_MODE", "false").lower() in ("1", "true", "yes")
+
+class EzRolesBot(discord.Bot):
+    def __init__(self, *args, low_memory=False, **kwargs):
+        kwargs.setdefault("chunk_guilds_at_startup", False)
+        if low_memory:
+            kwargs.setdefault("member_cache_flags", discord.MemberCacheFlags.none())
+        super().__init__(*args, **kwargs)
+        self.low_memory = low_memory
+        self.db = DatabaseManager(
+            "database/ezroles.db",
+            shards=int(os.getenv("DATABASE_SHARDS", "1")),
+            metrics_interval=int(os.getenv("DATABASE_METRICS_INTERVAL", "300")),
+            config_cache_size=int(os.getenv("CONFIG_CACHE_SIZE", "10000")),
+            snapshot_max_age=int(os.getenv("CACHE_SNAPSHOT_MAX_AGE", "86400")),
+            invalidation_interval=float(os.getenv("CACHE_INVALIDATION_INTERVAL", "0"))
+        )
+        self.role_index = RoleIndex(self)
+        self.member_chunker = MemberChunker(self, interval=float(os.getenv("MEMBER_CHUNK_INTERVAL", "1")))
+        self.member_tracker = None
+        if low_memory:
+            self.member_tracker = MemberRoleTracker(self)
+            self.member_tracker.install()
+
+    async def close(self):
+        try:
+            await self.db.close()
+        except Exception as e:
+            logger.error(f"Error closing database: {e}")
+        await super().close()
+
+bot = EzRolesBot(
     intents=discord.Intents.all(),
     debug_guilds=[1053821548663939072],
-    activity=discord.CustomActivity("/info | EzRoles.xyz")
+    activity=discord.CustomActivity("/info | EzRoles.xyz"),
+    low_memory=LOW_MEMORY_MODE
 )
 
 @bot.event
@@ -35,6 +71,7 @@ if __name__ == "__main__":
                 logger.error(f"Error when loading Cog {filename}: {e}")
 
     try:
+        bot.db.check_layout()
         bot.run(os.getenv("TEST"))
     except Exception as e:
         logger.critical(f"Error starting the bot: {e}")
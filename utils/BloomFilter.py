@@ -0,0 +1,75 @@
+import hashlib
+import math
+import os
+import struct
+
+HEADER = struct.Struct("<4sHQIQQ16s")
+MAGIC = b"EZBF"
+VERSION = 1
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.num_bits = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, guild_id, user_id):
+        digest = hashlib.blake2b(struct.pack("<qq", guild_id, user_id), digest_size=16).digest()
+        first, second = struct.unpack("<QQ", digest)
+        second |= 1
+        return [(first + index * second) % self.num_bits for index in range(self.num_hashes)]
+
+    def add(self, guild_id, user_id):
+        added = False
+        for position in self._positions(guild_id, user_id):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(*key))
+
+    def estimated_false_positive_rate(self):
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def save(self, path, stamp):
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.num_bits, self.num_hashes, self.count, self.capacity, stamp))
+            file.write(self.bits)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path, stamp, error_rate=0.01):
+        try:
+            with open(path, "rb") as file:
+                header = file.read(HEADER.size)
+                if len(header) != HEADER.size:
+                    return None
+
+                magic, version, num_bits, num_hashes, count, capacity, file_stamp = HEADER.unpack(header)
+                if magic != MAGIC or version != VERSION or file_stamp != stamp:
+                    return None
+
+                bits = bytearray(file.read())
+        except FileNotFoundError:
+            return None
+
+        if len(bits) != (num_bits + 7) // 8:
+            return None
+
+        bloom = cls.__new__(cls)
+        bloom.capacity = capacity
+        bloom.error_rate = error_rate
+        bloom.num_bits = num_bits
+        bloom.num_hashes = num_hashes
+        bloom.bits = bits
+        bloom.count = count
+        return bloom
@@ -0,0 +1,91 @@
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"EZWS"
+VERSION = 2
+HEADER = struct.Struct("<4sHdIHBI16s")
+ENTRY = struct.Struct("<BqI")
+ROLE_ID = struct.Struct("<q")
+STATUS_MAPPING = struct.Struct("<qH")
+
+# Only guild configuration; status matchers compile in milliseconds and member statuses are stale after a restart.
+FEATURES = ("autoroles", "statusroles", "stickyroles")
+
+def snapshot_path(db_path):
+    return f"{os.path.splitext(db_path)[0]}.cache.snapshot"
+
+def encode_value(feature, value):
+    if feature == "autoroles":
+        return struct.pack(f"<{len(value)}q", *value)
+    if feature == "statusroles":
+        parts = []
+        for role_id, status_text in value:
+            text = status_text.encode("utf-8")
+            parts.append(STATUS_MAPPING.pack(role_id, len(text)) + text)
+        return b"".join(parts)
+    return b"\x01" if value else b"\x00"
+
+def decode_value(feature, buffer, offset, length):
+    if feature == "autoroles":
+        return struct.unpack_from(f"<{length // ROLE_ID.size}q", buffer, offset)
+    if feature == "statusroles":
+        mappings = []
+        end = offset + length
+        while offset < end:
+            role_id, text_length = STATUS_MAPPING.unpack_from(buffer, offset)
+            offset += STATUS_MAPPING.size
+            mappings.append((role_id, bytes(buffer[offset:offset + text_length]).decode("utf-8")))
+            offset += text_length
+        return tuple(mappings)
+    return buffer[offset] == 1
+
+def write_snapshot(path, cache, schema_version, shards, stamp):
+    entries = [(FEATURES.index(feature), guild_id, encode_value(feature, value))
+               for (feature, guild_id), value in cache.entries.items() if feature in FEATURES]
+    # Stale keys are not in the snapshot, so a feature with any of them cannot be restored as complete.
+    stale_features = {feature for feature, _ in cache.stale}
+    complete = sum(1 << index for index, feature in enumerate(FEATURES)
+                   if feature in cache.complete and feature not in stale_features)
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, time.time(), schema_version, shards, complete, len(entries), stamp))
+        for feature_index, guild_id, payload in entries:
+            file.write(ENTRY.pack(feature_index, guild_id, len(payload)))
+            file.write(payload)
+    os.replace(temporary_path, path)
+    return len(entries)
+
+def read_snapshot(path, schema_version, shards, max_age, stamp):
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+    with file:
+        if os.fstat(file.fileno()).st_size < HEADER.size:
+            return None
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            magic, version, created_at, file_schema_version, file_shards, complete, count, file_stamp = HEADER.unpack_from(buffer, 0)
+            if magic != MAGIC or version != VERSION:
+                return None
+            # Any configuration change, rebalance or swapped database file since the snapshot was written changes the stamp.
+            if file_schema_version != schema_version or file_shards != shards or file_stamp != stamp:
+                return None
+            if time.time() - created_at > max_age:
+                return None
+
+            entries = []
+            offset = HEADER.size
+            for _ in range(count):
+                feature_index, guild_id, length = ENTRY.unpack_from(buffer, offset)
+                offset += ENTRY.size
+                feature = FEATURES[feature_index]
+                entries.append((feature, guild_id, decode_value(feature, buffer, offset, length)))
+                offset += length
+
+    complete_features = {feature for index, feature in enumerate(FEATURES) if complete & (1 << index)}
+    return complete_features, entries
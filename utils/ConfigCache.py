@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+MISSING = object()
+
+class ConfigCache:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.invalidations = 0
+        self.complete = set()
+        self.stale = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, feature, guild_id, empty=MISSING):
+        key = (feature, guild_id)
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            # Fully preloaded features hold every configured guild, so a miss means no configuration.
+            if empty is not MISSING and feature in self.complete and key not in self.stale:
+                self.hits += 1
+                return empty
+            self.misses += 1
+            return MISSING
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def token(self):
+        return self.invalidations
+
+    def set(self, feature, guild_id, value, token=None):
+        if self.max_entries <= 0:
+            return
+        # A write that landed while the value was being loaded makes it stale.
+        if token is not None and token != self.invalidations:
+            return
+
+        key = (feature, guild_id)
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self.stale.discard(key)
+
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self.evictions += 1
+            if evicted[0] in self.complete:
+                self.mark_incomplete(evicted[0])
+
+    def mark_complete(self, feature):
+        self.complete.add(feature)
+
+    def mark_incomplete(self, feature):
+        self.complete.discard(feature)
+        self.stale = {key for key in self.stale if key[0] != feature}
+
+    def invalidate(self, feature, guild_id):
+        self.invalidations += 1
+        self.entries.pop((feature, guild_id), None)
+        if feature in self.complete:
+            self.stale.add((feature, guild_id))
+
+    def invalidate_guild(self, guild_id):
+        self.invalidations += 1
+        for key in [key for key in self.entries if key[1] == guild_id]:
+            del self.entries[key]
+        for feature in self.complete:
+            self.stale.add((feature, guild_id))
+
+    def clear(self):
+        self.invalidations += 1
+        self.entries.clear()
+        self.complete.clear()
+        self.stale.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "complete_features": len(self.complete),
+        }
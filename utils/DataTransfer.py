@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+from utils.RoleSets import intern_role_ids, unpack_role_ids, backup_role_hash, BACKUP_ROLE_FIELDS
+
+logger = logging.getLogger("database")
+
+FORMAT_NAME = "ezroles-ndjson"
+FORMAT_VERSION = 1
+
+EXPORT_QUERIES = {
+    "autorole": "SELECT guild_id, role_id, added_by, added_at FROM autoroles",
+    "statusrole": "SELECT guild_id, role_id, status_text, added_by, added_at FROM statusroles",
+    "sticky_settings": "SELECT guild_id, is_enabled, updated_at FROM guild_settings",
+    "member_roles": """
+        SELECT m.guild_id, m.user_id, rs.role_ids, m.updated_at
+        FROM member_roles m
+        JOIN role_sets rs ON rs.set_id = m.role_set_id
+    """,
+}
+
+def open_ndjson(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def guild_filter(query, guild_ids, column="guild_id"):
+    if not guild_ids:
+        return query, ()
+    placeholders = ','.join(['?'] * len(guild_ids))
+    keyword = "AND" if " WHERE " in query.upper() else "WHERE"
+    return f"{query} {keyword} {column} IN ({placeholders})", tuple(guild_ids)
+
+class DataTransfer:
+    def __init__(self, db, chunk_size=1000):
+        self.db = db
+        self.chunk_size = chunk_size
+
+    def _shards_for(self, guild_ids):
+        if guild_ids:
+            return sorted({self.db.shard_for(guild_id) for guild_id in guild_ids})
+        return range(self.db.shards)
+
+    async def iter_records(self, guild_ids=None):
+        await self.db.stickyroles.flush_member_roles()
+
+        for shard in self._shards_for(guild_ids):
+            for record_type, base_query in EXPORT_QUERIES.items():
+                column = "m.guild_id" if record_type == "member_roles" else "guild_id"
+                query, params = guild_filter(base_query, guild_ids, column)
+
+                async with self.db.read(shard=shard) as db:
+                    cursor = await db.execute(query, params)
+                    while True:
+                        rows = await cursor.fetchmany(self.chunk_size)
+                        if not rows:
+                            break
+
+                        for row in rows:
+                            record = {"type": record_type, **dict(row)}
+                            if record_type == "member_roles":
+                                record["role_ids"] = unpack_role_ids(record["role_ids"])
+                            elif record_type == "sticky_settings":
+                                record["is_enabled"] = bool(record["is_enabled"])
+                            yield record
+
+            async for record in self._iter_backups(shard, guild_ids):
+                yield record
+
+    async def _iter_backups(self, shard, guild_ids):
+        query, params = guild_filter(
+            "SELECT snapshot_id, guild_id, created_by, created_at FROM backup_snapshots",
+            guild_ids
+        )
+        async with self.db.read(shard=shard) as db:
+            cursor = await db.execute(query + " ORDER BY snapshot_id", params)
+            while True:
+                snapshots = await cursor.fetchmany(self.chunk_size)
+                if not snapshots:
+                    break
+
+                for snapshot in snapshots:
+                    roles_cursor = await db.execute(
+                        f"""
+                        SELECT {', '.join('r.' + field for field in BACKUP_ROLE_FIELDS)}
+                        FROM backup_snapshot_roles sr
+                        JOIN backup_roles r ON r.role_hash = sr.role_hash
+                        WHERE sr.snapshot_id = ?
+                        ORDER BY r.position, r.id
+                        """,
+                        (snapshot['snapshot_id'],)
+                    )
+                    roles = [
+                        {**dict(role), 'hoist': bool(role['hoist']), 'mentionable': bool(role['mentionable'])}
+                        for role in await roles_cursor.fetchall()
+                    ]
+                    yield {
+                        "type": "backup",
+                        "guild_id": snapshot['guild_id'],
+                        "created_by": snapshot['created_by'],
+                        "created_at": snapshot['created_at'],
+                        "roles": roles,
+                    }
+
+    async def export_ndjson(self, path, guild_ids=None):
+        await self.db.setup()
+        counts = {}
+        with open_ndjson(path, "w") as file:
+            file.write(json.dumps({
+                "type": "header",
+                "format": FORMAT_NAME,
+                "version": FORMAT_VERSION,
+                "schema_version": self.db.schema_version,
+            }) + "\n")
+
+            async for record in self.iter_records(guild_ids):
+                file.write(json.dumps(record, separators=(",", ":")) + "\n")
+                counts[record["type"]] = counts.get(record["type"], 0) + 1
+
+        logger.info(f"Exported {sum(counts.values())} records to {path}: {counts}")
+        return counts
+
+    async def import_ndjson(self, path):
+        await self.db.setup()
+        counts = {}
+        batches = {}
+        pending = 0
+
+        with open_ndjson(path, "r") as file:
+            header = json.loads(file.readline() or "{}")
+            if header.get("format") != FORMAT_NAME or header.get("version") != FORMAT_VERSION:
+                raise ValueError(f"{path} is not an {FORMAT_NAME} v{FORMAT_VERSION} file")
+
+            for line_number, line in enumerate(file, start=2):
+                if not line.strip():
+                    continue
+
+                try:
+                    record = json.loads(line)
+                    shard = self.db.shard_for(record["guild_id"])
+                except (json.JSONDecodeError, KeyError, TypeError) as e:
+                    raise ValueError(f"Invalid record on line {line_number} of {path}: {e}") from e
+
+                batches.setdefault(shard, []).append(record)
+                counts[record["type"]] = counts.get(record["type"], 0) + 1
+                pending += 1
+
+                if pending >= self.chunk_size:
+                    await self._write_batches(batches)
+                    batches = {}
+                    pending = 0
+
+        await self._write_batches(batches)
+        logger.info(f"Imported {sum(counts.values())} records from {path}: {counts}")
+        return counts
+
+    async def _write_batches(self, batches):
+        for shard, records in batches.items():
+            async with self.db.write(shard=shard) as db:
+                backup_guilds = set()
+                for record in records:
+                    if await self._write_record(db, record) and record["type"] == "backup":
+                        backup_guilds.add(record["guild_id"])
+                # Imported snapshots count against the same limit as ones taken by the bot.
+                for guild_id in backup_guilds:
+                    await self.db.backups._enforce_retention(db, guild_id)
+            self.db.config_cache.clear()
+            await asyncio.sleep(0)
+
+    async def _write_record(self, db, record):
+        record_type = record["type"]
+
+        if record_type == "autorole":
+            await db.execute(
+                "INSERT OR REPLACE INTO autoroles (guild_id, role_id, added_by, added_at) VALUES (?, ?, ?, ?)",
+                (record["guild_id"], record["role_id"], record.get("added_by"), record.get("added_at"))
+            )
+            await self.db.autoroles.record_change(db, record["guild_id"])
+        elif record_type == "statusrole":
+            await db.execute(
+                "INSERT OR REPLACE INTO statusroles (guild_id, role_id, status_text, added_by, added_at) VALUES (?, ?, ?, ?, ?)",
+                (record["guild_id"], record["role_id"], record["status_text"], record.get("added_by"), record.get("added_at"))
+            )
+            await self.db.statusroles.record_change(db, record["guild_id"])
+        elif record_type == "sticky_settings":
+            await db.execute(
+                "INSERT OR REPLACE INTO guild_settings (guild_id, is_enabled, updated_at) VALUES (?, ?, ?)",
+                (record["guild_id"], record["is_enabled"], record.get("updated_at"))
+            )
+            await self.db.stickyroles.record_change(db, record["guild_id"])
+        elif record_type == "member_roles":
+            set_id, blob = intern_role_ids(record["guild_id"], record["role_ids"])
+            await db.execute(
+                "INSERT OR IGNORE INTO role_sets (set_id, guild_id, role_ids) VALUES (?, ?, ?)",
+                (set_id, record["guild_id"], blob)
+            )
+            await db.execute(
+                "INSERT OR REPLACE INTO member_roles (guild_id, user_id, role_set_id, updated_at, seq) VALUES (?, ?, ?, ?, ?)",
+                (record["guild_id"], record["user_id"], set_id, record.get("updated_at"),
+                 await self.db.stickyroles.reserve_member_seq(db, 1))
+            )
+            self.db.stickyroles.remember_member(record["guild_id"], record["user_id"])
+        elif record_type == "backup":
+            guild_id = record["guild_id"]
+            roles = record["roles"]
+            hashes = [backup_role_hash(guild_id, role) for role in roles]
+            # Re-importing the same file must not stack up copies of a snapshot. created_at has one-second
+            # resolution, so snapshots taken in the same second only count as copies if they hold the same roles.
+            cursor = await db.execute(
+                """
+                SELECT s.snapshot_id, sr.role_hash
+                FROM backup_snapshots s
+                LEFT JOIN backup_snapshot_roles sr ON sr.snapshot_id = s.snapshot_id
+                WHERE s.guild_id = ? AND s.created_at = ?
+                """,
+                (guild_id, record.get("created_at"))
+            )
+            existing = {}
+            for snapshot_id, role_hash in await cursor.fetchall():
+                role_hashes = existing.setdefault(snapshot_id, set())
+                if role_hash is not None:
+                    role_hashes.add(role_hash)
+            if set(hashes) in existing.values():
+                return False
+
+            cursor = await db.execute(
+                "INSERT INTO backup_snapshots (guild_id, created_by, created_at, role_count) VALUES (?, ?, ?, ?)",
+                (guild_id, record.get("created_by"), record.get("created_at"), len(roles))
+            )
+            await db.executemany(
+                f"INSERT OR IGNORE INTO backup_roles (role_hash, guild_id, {', '.join(BACKUP_ROLE_FIELDS)}) VALUES (?, ?, {','.join(['?'] * len(BACKUP_ROLE_FIELDS))})",
+                [(role_hash, guild_id, *(role.get(field) for field in BACKUP_ROLE_FIELDS)) for role_hash, role in zip(hashes, roles)]
+            )
+            await db.executemany(
+                "INSERT OR IGNORE INTO backup_snapshot_roles (snapshot_id, role_hash) VALUES (?, ?)",
+                [(cursor.lastrowid, role_hash) for role_hash in hashes]
+            )
+        else:
+            logger.warning(f"Skipping unknown record type {record_type}")
+            return False
+        return True
+
+async def run(args):
+    from utils.DatabaseManager import DatabaseManager
+
+    db = DatabaseManager(args.database, shards=args.shards, metrics_interval=0)
+    db.transfer.chunk_size = args.chunk_size
+    try:
+        if args.command == "export":
+            await db.transfer.export_ndjson(args.file, args.guild)
+        else:
+            await db.transfer.import_ndjson(args.file)
+    finally:
+        await db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import EzRoles data as NDJSON.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("file", help="NDJSON file to write or read, gzip-compressed if it ends with .gz")
+    parser.add_argument("--guild", type=int, action="append", help="Only export this guild (repeatable)")
+    parser.add_argument("--database", default="database/ezroles.db", help="Base path of the database")
+    parser.add_argument("--shards", type=int, default=int(os.getenv("DATABASE_SHARDS", "1")), help="Number of database shards")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Records per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -1,427 +1,420 @@
 import aiosqlite
+import asyncio
+import glob
+import hashlib
 import os
 import logging
-import json
-from datetime import datetime
+import re
+import sqlite3
+import uuid
+from contextlib import asynccontextmanager, closing
+from utils.CacheSnapshot import read_snapshot, snapshot_path, write_snapshot
+from utils.ConfigCache import ConfigCache
+from utils.DatabaseMetrics import DatabaseMetrics
+from utils.DataTransfer import DataTransfer
+from utils.InvalidationBus import InvalidationBus
+from utils.Migrations import get_schema_version, run_migrations
+from utils.Repositories import (
+    AutoRoleRepository,
+    StatusRoleRepository,
+    StickyRoleRepository,
+    RoleBackupRepository,
+    GuildRepository,
+)
 
 logger = logging.getLogger("database")
 
-class DatabaseManager:
-    def __init__(self, db_path="database/autorole.db"):
+DEFAULT_PRAGMAS = {
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+
+class ConnectionPool:
+    def __init__(self, db_path, readers=4, pragmas=None):
         self.db_path = db_path
-        self.db_type = os.path.basename(db_path).split('.')[0]
-        
-    async def setup(self):
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            if self.db_type == "autorole":
-                await db.execute('''
-                    CREATE TABLE IF NOT EXISTS autoroles (
-                        guild_id INTEGER,
-                        role_id INTEGER,
-                        added_by INTEGER,
-                        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        PRIMARY KEY (guild_id, role_id)
-                    )
-                ''')
-            elif self.db_type == "statusrole":
-                await db.execute('''
-                    CREATE TABLE IF NOT EXISTS statusroles (
-                        guild_id INTEGER,
-                        role_id INTEGER,
-                        status_text TEXT,
-                        added_by INTEGER,
-                        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        PRIMARY KEY (guild_id, role_id, status_text)
-                    )
-                ''')
-            elif self.db_type == "stickyroles":
-                await db.execute('''
-                    CREATE TABLE IF NOT EXISTS guild_settings (
-                        guild_id INTEGER PRIMARY KEY,
-                        is_enabled BOOLEAN DEFAULT 0,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                await db.execute('''
-                    CREATE TABLE IF NOT EXISTS member_roles (
-                        guild_id INTEGER,
-                        user_id INTEGER,
-                        role_ids TEXT,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        PRIMARY KEY (guild_id, user_id)
-                    )
-                ''')
-            elif self.db_type == "rolebackup":
-                await db.execute('''
-                    CREATE TABLE IF NOT EXISTS role_backups (
-                        guild_id INTEGER PRIMARY KEY,
-                        created_by INTEGER,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        roles_data TEXT
-                    )
-                ''')
-            
-            await db.commit()
-
-    async def add_autorole(self, guild_id, role_id, author_id):
-        if self.db_type != "autorole":
-            logger.error(f"Attempted to use autorole method on {self.db_type} database")
-            return False
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT role_id FROM autoroles WHERE guild_id = ? AND role_id = ?",
-                (guild_id, role_id)
-            )
-            existing_role = await cursor.fetchone()
-            
-            if existing_role:
-                return False
-            
-            await db.execute(
-                "INSERT INTO autoroles (guild_id, role_id, added_by) VALUES (?, ?, ?)",
-                (guild_id, role_id, author_id)
-            )
-            await db.commit()
-            return True
-    
-    async def remove_autorole(self, guild_id, role_id):
-        if self.db_type != "autorole":
-            logger.error(f"Attempted to use autorole method on {self.db_type} database")
-            return False
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "DELETE FROM autoroles WHERE guild_id = ? AND role_id = ?",
-                (guild_id, role_id)
-            )
-            await db.commit()
-            return cursor.rowcount > 0
-    
-    async def get_autoroles(self, guild_id):
-        if self.db_type != "autorole":
-            logger.error(f"Attempted to use autorole method on {self.db_type} database")
-            return []
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT role_id FROM autoroles WHERE guild_id = ?",
-                (guild_id,)
-            )
-            roles = await cursor.fetchall()
-            return [role[0] for role in roles]
-    
-    async def clear_autoroles(self, guild_id):
-        if self.db_type != "autorole":
-            logger.error(f"Attempted to use autorole method on {self.db_type} database")
-            return 0
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "DELETE FROM autoroles WHERE guild_id = ?",
-                (guild_id,)
-            )
-            await db.commit()
-            return cursor.rowcount
-    
-    async def remove_nonexisting_roles(self, guild_id, valid_role_ids):
-        if self.db_type != "autorole":
-            logger.error(f"Attempted to use autorole method on {self.db_type} database")
-            return 0
-            
-        if not valid_role_ids:
-            return await self.clear_autoroles(guild_id)
-        
-        placeholders = ','.join(['?'] * len(valid_role_ids))
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                f"DELETE FROM autoroles WHERE guild_id = ? AND role_id NOT IN ({placeholders})",
-                (guild_id, *valid_role_ids)
-            )
-            await db.commit()
-            return cursor.rowcount
-    
-    async def add_statusrole(self, guild_id, role_id, status_text, author_id):
-        if self.db_type != "statusrole":
-            logger.error(f"Attempted to use statusrole method on {self.db_type} database")
-            return False
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT role_id FROM statusroles WHERE guild_id = ? AND role_id = ? AND status_text = ?",
-                (guild_id, role_id, status_text)
-            )
-            existing_role = await cursor.fetchone()
-            
-            if existing_role:
-                return False
-            
-            await db.execute(
-                "INSERT INTO statusroles (guild_id, role_id, status_text, added_by) VALUES (?, ?, ?, ?)",
-                (guild_id, role_id, status_text, author_id)
-            )
-            await db.commit()
-            return True
+        self.reader_count = max(1, readers)
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self.writer_connection = None
+        self.writer_lock = asyncio.Lock()
+        self.readers = None
+        self.reader_connections = []
 
-    async def remove_statusrole(self, guild_id, role_id, status_text):
-        if self.db_type != "statusrole":
-            logger.error(f"Attempted to use statusrole method on {self.db_type} database")
-            return False
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "DELETE FROM statusroles WHERE guild_id = ? AND role_id = ? AND status_text = ?",
-                (guild_id, role_id, status_text)
-            )
-            await db.commit()
-            return cursor.rowcount > 0
+    @property
+    def is_open(self):
+        return self.writer_connection is not None
 
-    async def remove_all_statusroles_for_role(self, guild_id, role_id):
-        if self.db_type != "statusrole":
-            logger.error(f"Attempted to use statusrole method on {self.db_type} database")
-            return False
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "DELETE FROM statusroles WHERE guild_id = ? AND role_id = ?",
-                (guild_id, role_id)
-            )
-            await db.commit()
-            return cursor.rowcount > 0
+    async def connect(self, read_only=False):
+        db = await aiosqlite.connect(self.db_path)
+        db.row_factory = aiosqlite.Row
+        for pragma, value in self.pragmas.items():
+            await db.execute(f"PRAGMA {pragma} = {value}")
+        if read_only:
+            await db.execute("PRAGMA query_only = 1")
+        return db
+
+    async def open(self):
+        if self.is_open:
+            return
+
+        self.writer_connection = await self.connect()
+        self.readers = asyncio.Queue()
+        for _ in range(self.reader_count):
+            db = await self.connect(read_only=True)
+            self.reader_connections.append(db)
+            self.readers.put_nowait(db)
+
+        logger.info(f"Opened connection pool for {self.db_path} with {self.reader_count} readers")
+
+    @asynccontextmanager
+    async def reader(self):
+        db = await self.readers.get()
+        try:
+            yield db
+        finally:
+            self.readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self):
+        async with self.writer_lock:
+            db = self.writer_connection
+            try:
+                yield db
+                await db.commit()
+            except BaseException:
+                # A cancelled caller must not leave its partial writes for the next commit.
+                await db.rollback()
+                raise
 
-    async def get_statusroles(self, guild_id):
-        if self.db_type != "statusrole":
-            logger.error(f"Attempted to use statusrole method on {self.db_type} database")
+    async def close(self):
+        if not self.is_open:
+            return
+
+        async with self.writer_lock:
+            await self.writer_connection.close()
+            self.writer_connection = None
+
+        for db in self.reader_connections:
+            await db.close()
+        self.reader_connections = []
+        self.readers = None
+
+        logger.info(f"Closed connection pool for {self.db_path}")
+
+def shard_index(guild_id, shards):
+    return (guild_id >> 22) % shards
+
+def shard_paths(db_path, shards):
+    if shards <= 1:
+        return [db_path]
+
+    base, extension = os.path.splitext(db_path)
+    return [f"{base}-shard{index}of{shards}{extension}" for index in range(shards)]
+
+def existing_layouts(db_path):
+    base, extension = os.path.splitext(db_path)
+    layouts = {}
+    candidates = [(db_path, 1)]
+    for path in glob.glob(f"{glob.escape(base)}-shard*of*{extension}"):
+        match = re.fullmatch(rf"{re.escape(base)}-shard\d+of(\d+){re.escape(extension)}", path)
+        if match:
+            candidates.append((path, int(match.group(1))))
+
+    for path, shards in candidates:
+        if not os.path.exists(path):
+            continue
+        with closing(sqlite3.connect(path)) as db:
+            if db.execute("PRAGMA user_version").fetchone()[0] > 0:
+                layouts.setdefault(shards, []).append(path)
+    return layouts
+
+class UnitOfWork:
+    def __init__(self, db):
+        self.db = db
+
+    async def insert_new(self, table, columns, rows, conflict, returning):
+        rows = list(rows)
+        if not rows:
             return []
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(
-                "SELECT role_id, status_text FROM statusroles WHERE guild_id = ?",
-                (guild_id,)
-            )
-            roles = await cursor.fetchall()
-            return [{'role_id': role['role_id'], 'status_text': role['status_text']} for role in roles]
 
-    async def clear_statusroles(self, guild_id):
-        if self.db_type != "statusrole":
-            logger.error(f"Attempted to use statusrole method on {self.db_type} database")
-            return 0
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "DELETE FROM statusroles WHERE guild_id = ?",
-                (guild_id,)
-            )
-            await db.commit()
-            return cursor.rowcount
+        row_placeholder = f"({','.join(['?'] * len(columns))})"
+        cursor = await self.db.execute(
+            f"""
+            INSERT INTO {table} ({', '.join(columns)}) VALUES {','.join([row_placeholder] * len(rows))}
+            ON CONFLICT ({', '.join(conflict)}) DO NOTHING
+            RETURNING {returning}
+            """,
+            [value for row in rows for value in row]
+        )
+        return [row[0] for row in await cursor.fetchall()]
 
-    async def remove_nonexisting_statusroles(self, guild_id, valid_role_ids):
-        if self.db_type != "statusrole":
-            logger.error(f"Attempted to use statusrole method on {self.db_type} database")
+class DatabaseManager:
+    def __init__(self, db_path="database/ezroles.db", pooled=True, readers=4, cache_size=None, mmap_size=None, pragmas=None,
+                 flush_size=500, flush_interval=2.0, backup_retention=5, shards=1, metrics_interval=300,
+                 config_cache_size=10000, snapshot_max_age=86400,
+                 invalidation_interval=0):
+        self.db_path = db_path
+        self.pooled = pooled
+        self.shards = max(1, shards)
+        self.shard_paths = shard_paths(db_path, self.shards)
+
+        pool_pragmas = dict(pragmas or {})
+        if cache_size is not None:
+            pool_pragmas["cache_size"] = cache_size
+        if mmap_size is not None:
+            pool_pragmas["mmap_size"] = mmap_size
+        self.pools = [ConnectionPool(path, readers=readers, pragmas=pool_pragmas) for path in self.shard_paths]
+        self.setup_lock = asyncio.Lock()
+        self.is_setup = False
+        self.schema_version = 0
+        self.metrics = DatabaseMetrics(self, interval=metrics_interval)
+        self.config_cache = ConfigCache(max_entries=config_cache_size)
+        self.snapshot_max_age = snapshot_max_age
+        self.snapshot_path = snapshot_path(db_path)
+        self.process_id = uuid.uuid4().hex
+        self.bus = InvalidationBus(self, interval=invalidation_interval)
+
+        self.autoroles = AutoRoleRepository(self)
+        self.statusroles = StatusRoleRepository(self)
+        self.stickyroles = StickyRoleRepository(self, flush_size=flush_size, flush_interval=flush_interval)
+        self.backups = RoleBackupRepository(self, retention=backup_retention)
+        self.guilds = GuildRepository(self)
+        self.transfer = DataTransfer(self)
+
+    def shard_for(self, guild_id):
+        return shard_index(guild_id, self.shards)
+
+    def _resolve_shard(self, guild_id, shard):
+        if shard is not None:
+            return shard
+        if guild_id is not None:
+            return self.shard_for(guild_id)
+        if self.shards == 1:
             return 0
-            
-        if not valid_role_ids:
-            return await self.clear_statusroles(guild_id)
-        
-        placeholders = ','.join(['?'] * len(valid_role_ids))
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                f"DELETE FROM statusroles WHERE guild_id = ? AND role_id NOT IN ({placeholders})",
-                (guild_id, *valid_role_ids)
-            )
-            await db.commit()
-            return cursor.rowcount
-    
-    async def set_feature_status(self, guild_id, is_enabled):
-        if self.db_type != "stickyroles":
-            logger.error(f"Attempted to use stickyroles method on {self.db_type} database")
-            return False
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT is_enabled FROM guild_settings WHERE guild_id = ?",
-                (guild_id,)
-            )
-            result = await cursor.fetchone()
-            
-            if result is not None and result[0] == is_enabled:
-                return False
-                
-            if result is None:
-                await db.execute(
-                    "INSERT INTO guild_settings (guild_id, is_enabled) VALUES (?, ?)",
-                    (guild_id, is_enabled)
-                )
-            else:
-                await db.execute(
-                    "UPDATE guild_settings SET is_enabled = ?, updated_at = CURRENT_TIMESTAMP WHERE guild_id = ?",
-                    (is_enabled, guild_id)
-                )
-                
-            await db.commit()
-            return True
-            
-    async def get_feature_status(self, guild_id):
-        if self.db_type != "stickyroles":
-            logger.error(f"Attempted to use stickyroles method on {self.db_type} database")
-            return False
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT is_enabled FROM guild_settings WHERE guild_id = ?",
-                (guild_id,)
-            )
-            result = await cursor.fetchone()
-            
-            return bool(result[0]) if result else False
-            
-    async def save_member_roles(self, guild_id, user_id, role_ids):
-        if self.db_type != "stickyroles":
-            logger.error(f"Attempted to use stickyroles method on {self.db_type} database")
-            return False
-            
-        role_json = json.dumps(role_ids)
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                """
-                INSERT OR REPLACE INTO member_roles
-                (guild_id, user_id, role_ids, updated_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                """,
-                (guild_id, user_id, role_json)
-            )
-            await db.commit()
-            return True
-            
-    async def get_member_roles(self, guild_id, user_id):
-        if self.db_type != "stickyroles":
-            logger.error(f"Attempted to use stickyroles method on {self.db_type} database")
-            return []
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT role_ids FROM member_roles WHERE guild_id = ? AND user_id = ?",
-                (guild_id, user_id)
+        raise ValueError("A guild_id or shard is required when the database is sharded")
+
+    @asynccontextmanager
+    async def read(self, guild_id=None, shard=None):
+        if not self.is_setup:
+            await self.setup()
+
+        pool = self.pools[self._resolve_shard(guild_id, shard)]
+        if pool.is_open:
+            async with pool.reader() as db:
+                yield db
+        else:
+            async with aiosqlite.connect(pool.db_path) as db:
+                db.row_factory = aiosqlite.Row
+                yield db
+
+    @asynccontextmanager
+    async def write(self, guild_id=None, shard=None):
+        if not self.is_setup:
+            await self.setup()
+
+        pool = self.pools[self._resolve_shard(guild_id, shard)]
+        if pool.is_open:
+            async with pool.writer() as db:
+                yield db
+        else:
+            async with aiosqlite.connect(pool.db_path) as db:
+                db.row_factory = aiosqlite.Row
+                yield db
+                await db.commit()
+
+    @asynccontextmanager
+    async def transaction(self, guild_id):
+        async with self.write(guild_id) as db:
+            yield UnitOfWork(db)
+
+    async def _has_migrated_shard(self):
+        # Any earlier layout of this database counts, e.g. after DATABASE_SHARDS was raised without a rebalance.
+        base, extension = os.path.splitext(self.db_path)
+        for path in [self.db_path, *glob.glob(f"{glob.escape(base)}-shard*of*{extension}")]:
+            if not os.path.exists(path):
+                continue
+            async with aiosqlite.connect(path) as db:
+                if await get_schema_version(db) >= 2:
+                    return True
+        return False
+
+    def check_layout(self):
+        if all(os.path.exists(path) for path in self.shard_paths):
+            return
+
+        # New, empty shard files next to a migrated layout would hide all existing data.
+        other_layouts = sorted(shards for shards in existing_layouts(self.db_path) if shards != self.shards)
+        if other_layouts:
+            raise RuntimeError(
+                f"Database {self.db_path} holds data in a {other_layouts[0]}-shard layout but {self.shards} shard(s) are configured. "
+                f"Run python -m utils.ShardRebalancer --source-shards {other_layouts[0]} --shards {self.shards} first, "
+                f"or set DATABASE_SHARDS back to {other_layouts[0]}."
             )
-            result = await cursor.fetchone()
-            
-            if not result:
-                return []
-                
+
+    async def setup(self):
+        async with self.setup_lock:
+            if self.is_setup:
+                return
+
+            self.check_layout()
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            # Only a database that has never been migrated imports the legacy files, not shards added later.
+            import_legacy = not await self._has_migrated_shard()
+
+            for index, pool in enumerate(self.pools):
+                owns_guild = lambda guild_id, index=index: self.shard_for(guild_id) == index
+
+                if self.pooled:
+                    await pool.open()
+                    async with pool.writer() as db:
+                        self.schema_version = await run_migrations(db, pool.db_path, owns_guild, import_legacy)
+                        await self._enable_incremental_vacuum(db, pool.db_path)
+                else:
+                    async with aiosqlite.connect(pool.db_path) as db:
+                        self.schema_version = await run_migrations(db, pool.db_path, owns_guild, import_legacy)
+                        await self._enable_incremental_vacuum(db, pool.db_path)
+
+            # Primed before the member filter loads, so the bus covers every row committed after the filter's stamp.
             try:
-                return json.loads(result[0])
-            except json.JSONDecodeError:
-                logger.error(f"Failed to decode role JSON for user {user_id} in guild {guild_id}")
-                return []
-                
-    async def clear_sticky_roles(self, guild_id):
-        if self.db_type != "stickyroles":
-            logger.error(f"Attempted to use stickyroles method on {self.db_type} database")
-            return 0
-            
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "DELETE FROM member_roles WHERE guild_id = ?",
-                (guild_id,)
-            )
-            await db.commit()
-            return cursor.rowcount
-    
-    async def save_role_backup(self, guild_id, user_id, roles_data):
-        if self.db_type != "rolebackup":
-            logger.error(f"Attempted to use rolebackup method on {self.db_type} database")
-            return False
-        
-        roles_json = json.dumps(roles_data)
-        
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(
-                    """
-                    INSERT OR REPLACE INTO role_backups
-                    (guild_id, created_by, created_at, roles_data)
-                    VALUES (?, ?, CURRENT_TIMESTAMP, ?)
-                    """,
-                    (guild_id, user_id, roles_json)
-                )
-                await db.commit()
-                return True
-        except Exception as e:
-            logger.error(f"Error saving role backup: {e}")
-            return False
-    
-    async def backup_exists(self, guild_id):
-        if self.db_type != "rolebackup":
-            logger.error(f"Attempted to use rolebackup method on {self.db_type} database")
-            return False
-        
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
-                    "SELECT 1 FROM role_backups WHERE guild_id = ?",
-                    (guild_id,)
-                )
-                result = await cursor.fetchone()
-                return result is not None
-        except Exception as e:
-            logger.error(f"Error checking if backup exists: {e}")
-            return False
-    
-    async def get_role_backup(self, guild_id):
-        if self.db_type != "rolebackup":
-            logger.error(f"Attempted to use rolebackup method on {self.db_type} database")
-            return None
-        
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                cursor = await db.execute(
-                    """
-                    SELECT guild_id, created_by, created_at, roles_data
-                    FROM role_backups
-                    WHERE guild_id = ?
-                    """,
-                    (guild_id,)
-                )
-                result = await cursor.fetchone()
-                
-                if not result:
-                    return None
-                
+                await self.bus.prime()
+            except Exception as e:
+                logger.error(f"Error starting cache invalidation bus: {e}")
+
+            self.stickyroles.start()
+            self.metrics.start()
+            self.is_setup = True
+            logger.info(f"Database {self.db_path} ready with {self.shards} shard(s) at schema version {self.schema_version}")
+
+            restored = False
+            try:
+                restored = await self.load_cache_snapshot()
+            except Exception as e:
+                logger.error(f"Error loading cache snapshot: {e}")
+
+            if not restored:
                 try:
-                    roles_data = json.loads(result['roles_data'])
-                    return {
-                        'guild_id': result['guild_id'],
-                        'created_by': result['created_by'],
-                        'created_at': result['created_at'],
-                        'roles': roles_data
-                    }
-                except json.JSONDecodeError:
-                    logger.error(f"Failed to decode roles JSON for guild {guild_id}")
-                    return None
-        except Exception as e:
-            logger.error(f"Error getting role backup: {e}")
-            return None
-    
-    async def delete_role_backup(self, guild_id):
-        if self.db_type != "rolebackup":
-            logger.error(f"Attempted to use rolebackup method on {self.db_type} database")
+                    await self.preload_config()
+                except Exception as e:
+                    logger.error(f"Error preloading guild configuration: {e}")
+
+            self.bus.start()
+
+    async def preload_config(self):
+        token = self.config_cache.token()
+        repositories = [self.autoroles, self.statusroles, self.stickyroles]
+        loaded = {repository.name: {} for repository in repositories}
+
+        for shard in range(self.shards):
+            for repository in repositories:
+                loaded[repository.name].update(await repository.load_config(shard))
+
+        if token != self.config_cache.token():
+            logger.info("Configuration changed while preloading, leaving the cache to fill on demand")
+            return
+
+        for feature, config in loaded.items():
+            for guild_id, value in config.items():
+                self.config_cache.set(feature, guild_id, value, token)
+
+        for feature, config in loaded.items():
+            if all((feature, guild_id) in self.config_cache.entries for guild_id in config):
+                self.config_cache.mark_complete(feature)
+
+        logger.info(
+            f"Preloaded configuration of {len({guild_id for config in loaded.values() for guild_id in config})} guilds "
+            f"({len(self.config_cache.complete)}/{len(loaded)} features fully cached)"
+        )
+
+    async def _config_stamp(self, seqs=None):
+        digest = hashlib.blake2b(digest_size=16)
+        for shard, pool in enumerate(self.pools):
+            stat = os.stat(pool.db_path)
+            async with self.read(shard=shard) as db:
+                cursor = await db.execute("SELECT COALESCE(MAX(seq), 0), COUNT(*) FROM config_versions")
+                latest, count = await cursor.fetchone()
+            if seqs is not None:
+                latest = seqs[shard]
+            digest.update(f"{shard}:{stat.st_dev}:{stat.st_ino}:{latest}:{count};".encode())
+        return digest.digest()
+
+    async def load_cache_snapshot(self):
+        if not self.snapshot_max_age:
+            return False
+
+        token = self.config_cache.token()
+        stamp = await self._config_stamp()
+        snapshot = read_snapshot(self.snapshot_path, self.schema_version, self.shards, self.snapshot_max_age, stamp)
+        if snapshot is None or token != self.config_cache.token():
             return False
-        
+
+        complete, entries = snapshot
+        for feature, guild_id, value in entries:
+            self.config_cache.set(feature, guild_id, value, token)
+        for feature in complete:
+            if all((entry_feature, guild_id) in self.config_cache.entries
+                   for entry_feature, guild_id, _ in entries if entry_feature == feature):
+                self.config_cache.mark_complete(feature)
+
+        logger.info(f"Restored {len(entries)} cached configuration entries from {self.snapshot_path}")
+        return True
+
+    async def save_cache_snapshot(self):
+        if not self.snapshot_max_age:
+            return 0
+
+        # With other processes writing, the cache only reflects the changes the bus has applied.
+        seqs = None
+        if self.bus.connections:
+            await self.bus.poll()
+            seqs = list(self.bus.last_seq)
+
+        loaders = {
+            self.autoroles.name: self.autoroles.get,
+            self.statusroles.name: self.statusroles.get,
+            self.stickyroles.name: self.stickyroles.get_feature_status,
+        }
+        for feature, guild_id in list(self.config_cache.stale):
+            await loaders[feature](guild_id)
+
+        stamp = await self._config_stamp(seqs)
+        return write_snapshot(self.snapshot_path, self.config_cache, self.schema_version, self.shards, stamp)
+
+    async def _enable_incremental_vacuum(self, db, db_path):
+        cursor = await db.execute("PRAGMA auto_vacuum")
+        if (await cursor.fetchone())[0] == 2:
+            return
+
+        logger.info(f"Converting {db_path} to incremental auto-vacuum, this rewrites the file once")
+        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await db.execute("VACUUM")
+
+    async def incremental_vacuum(self, shard, pages):
+        async with self.write(shard=shard) as db:
+            await db.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            cursor = await db.execute("PRAGMA freelist_count")
+            return (await cursor.fetchone())[0]
+
+    async def freelist_count(self, shard):
+        async with self.read(shard=shard) as db:
+            cursor = await db.execute("PRAGMA freelist_count")
+            return (await cursor.fetchone())[0]
+
+    async def close(self):
+        if not self.is_setup:
+            return
+
+        self.metrics.stop()
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
-                    "DELETE FROM role_backups WHERE guild_id = ?",
-                    (guild_id,)
-                )
-                await db.commit()
-                success = cursor.rowcount > 0
-                return success
+            await self.save_cache_snapshot()
         except Exception as e:
-            logger.error(f"Error deleting role backup: {e}")
-            return False
\ No newline at end of file
+            logger.error(f"Error saving cache snapshot: {e}")
+        # The member filter checks with the bus how far it has synced before it is saved.
+        await self.stickyroles.stop()
+        await self.bus.stop()
+        for pool in self.pools:
+            await pool.close()
+        self.is_setup = False
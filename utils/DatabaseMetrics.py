@@ -0,0 +1,181 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+
+logger = logging.getLogger("database")
+
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+class MethodStats:
+    __slots__ = ("calls", "errors", "rows", "total_ms", "max_ms", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def record(self, elapsed_ms, rows, failed):
+        self.calls += 1
+        self.rows += rows
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if failed:
+            self.errors += 1
+
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[index] += 1
+                break
+
+    def percentile(self, fraction):
+        if not self.calls:
+            return 0.0
+
+        threshold = self.calls * fraction
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= threshold:
+                return bound if bound != float("inf") else self.max_ms
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "avg_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "histogram": dict(zip(LATENCY_BUCKETS_MS, self.buckets)),
+        }
+
+def count_rows(result):
+    if isinstance(result, bool):
+        return int(result)
+    if isinstance(result, int):
+        return result
+    if isinstance(result, (list, tuple, set, dict)):
+        return len(result)
+    return 0 if result is None else 1
+
+def instrumented(func):
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        failed = False
+        result = None
+        try:
+            result = await func(self, *args, **kwargs)
+            return result
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.db.metrics.record(f"{self.name}.{func.__name__}", elapsed_ms, count_rows(result), failed)
+
+    return wrapper
+
+class DatabaseMetrics:
+    def __init__(self, db, interval=300):
+        self.db = db
+        self.interval = interval
+        self.methods = {}
+        self.files = {}
+        self.counters = {}
+        self.gauge_sources = {}
+        self.task = None
+
+    def record(self, name, elapsed_ms, rows=0, failed=False):
+        stats = self.methods.get(name)
+        if stats is None:
+            stats = self.methods[name] = MethodStats()
+        stats.record(elapsed_ms, rows, failed)
+
+    def increment(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        self.counters[name] = value
+
+    def add_gauges(self, prefix, source):
+        self.gauge_sources[prefix] = source
+
+    async def sample_files(self):
+        for shard, path in enumerate(self.db.shard_paths):
+            async with self.db.read(shard=shard) as db:
+                page_size = (await (await db.execute("PRAGMA page_size")).fetchone())[0]
+                page_count = (await (await db.execute("PRAGMA page_count")).fetchone())[0]
+                freelist_count = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+
+            wal_path = f"{path}-wal"
+            self.files[path] = {
+                "file_bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+                "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+                "page_size": page_size,
+                "page_count": page_count,
+                "freelist_count": freelist_count,
+            }
+        return self.files
+
+    def sample_gauges(self):
+        for name, value in self.db.config_cache.stats().items():
+            self.set_gauge(f"config_cache.{name}", value)
+        for name, value in self.db.stickyroles.member_filter_stats().items():
+            self.set_gauge(f"member_filter.{name}", value)
+        if self.db.bus.enabled:
+            self.set_gauge("invalidation_bus.received", self.db.bus.received)
+        for prefix, source in self.gauge_sources.items():
+            for name, value in source().items():
+                self.set_gauge(f"{prefix}.{name}", value)
+
+    def snapshot(self):
+        return {
+            "methods": {name: stats.to_dict() for name, stats in sorted(self.methods.items())},
+            "files": dict(self.files),
+            "counters": dict(self.counters),
+        }
+
+    def format_report(self):
+        lines = ["Database metrics:"]
+        for name, stats in sorted(self.methods.items(), key=lambda item: item[1].total_ms, reverse=True):
+            data = stats.to_dict()
+            lines.append(
+                f"  {name}: {data['calls']} calls, {data['errors']} errors, {data['rows']} rows, "
+                f"avg {data['avg_ms']:.2f} ms, p95 <= {data['p95_ms']:g} ms, max {data['max_ms']:.2f} ms"
+            )
+        for path, data in self.files.items():
+            lines.append(
+                f"  {path}: {data['file_bytes']} bytes (+{data['wal_bytes']} WAL), "
+                f"{data['page_count']} pages of {data['page_size']} bytes, {data['freelist_count']} free"
+            )
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"  {name}: {value}")
+        return "\n".join(lines)
+
+    def start(self):
+        if self.task is None and self.interval:
+            self.task = asyncio.create_task(self._report_loop())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sample_files()
+                self.sample_gauges()
+                logger.info(self.format_report())
+            except Exception as e:
+                logger.error(f"Error reporting database metrics: {e}")
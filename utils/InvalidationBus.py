@@ -0,0 +1,97 @@
+import asyncio
+import logging
+
+logger = logging.getLogger("database")
+
+class InvalidationBus:
+    def __init__(self, db, interval=1.0):
+        self.db = db
+        self.interval = interval
+        self.connections = []
+        self.data_versions = []
+        self.last_seq = []
+        self.last_member_seq = []
+        self.task = None
+        self.received = 0
+
+    @property
+    def enabled(self):
+        return bool(self.interval)
+
+    async def prime(self):
+        if not self.enabled or self.connections:
+            return
+
+        for pool in self.db.pools:
+            connection = await pool.connect(read_only=True)
+            self.connections.append(connection)
+            self.data_versions.append(await self._data_version(connection))
+
+            cursor = await connection.execute("SELECT COALESCE(MAX(seq), 0) FROM config_versions")
+            self.last_seq.append((await cursor.fetchone())[0])
+            cursor = await connection.execute("SELECT COALESCE(MAX(seq), 0) FROM member_roles")
+            self.last_member_seq.append((await cursor.fetchone())[0])
+
+    def start(self):
+        if self.enabled and self.task is None:
+            self.task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
+        self.data_versions = []
+        self.last_seq = []
+        self.last_member_seq = []
+
+    async def _data_version(self, connection):
+        cursor = await connection.execute("PRAGMA data_version")
+        return (await cursor.fetchone())[0]
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Error polling for cache invalidations: {e}")
+
+    async def poll(self):
+        applied = 0
+        for shard, connection in enumerate(self.connections):
+            # data_version only moves when another connection commits to the file.
+            data_version = await self._data_version(connection)
+            if data_version == self.data_versions[shard]:
+                continue
+            self.data_versions[shard] = data_version
+
+            cursor = await connection.execute(
+                "SELECT feature, guild_id, seq, origin FROM config_versions WHERE seq > ? ORDER BY seq",
+                (self.last_seq[shard],)
+            )
+            for feature, guild_id, seq, origin in await cursor.fetchall():
+                self.last_seq[shard] = seq
+                if origin != self.db.process_id:
+                    self.db.config_cache.invalidate(feature, guild_id)
+                    applied += 1
+
+            stickyroles = self.db.stickyroles
+            if stickyroles.member_filter is not None or stickyroles.filter_backlog is not None:
+                await self._sync_member_filter(shard, connection)
+
+        self.received += applied
+        return applied
+
+    async def _sync_member_filter(self, shard, connection):
+        # seq is handed out inside the writing transaction, so it grows in commit order; updated_at does not.
+        cursor = await connection.execute(
+            "SELECT guild_id, user_id, seq FROM member_roles WHERE seq > ? ORDER BY seq",
+            (self.last_member_seq[shard],)
+        )
+        for guild_id, user_id, seq in await cursor.fetchall():
+            self.db.stickyroles.remember_member(guild_id, user_id)
+            self.last_member_seq[shard] = seq
@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from utils.DatabaseManager import DatabaseManager
+from utils.DataTransfer import FORMAT_NAME, FORMAT_VERSION
+
+# Guild ids spread over the shards, one per worker.
+def guild_ids(workers):
+    return [(index + 1) << 22 for index in range(workers)]
+
+async def worker(args):
+    db = DatabaseManager(args.database, shards=args.shards, metrics_interval=0, invalidation_interval=args.interval)
+    await db.setup()
+    try:
+        guilds = guild_ids(args.workers)
+        for guild_id in guilds:
+            await db.autoroles.get(guild_id)
+        if db.stickyroles.filter_task is not None:
+            await db.stickyroles.filter_task
+
+        await asyncio.sleep(max(0.0, args.start_at - time.time()))
+
+        # One member saved normally and one imported with a historical timestamp, which used to slip past the bus.
+        guild_id = guilds[args.index]
+        await db.autoroles.add(guild_id, 1000 + args.index, args.index)
+        await db.stickyroles.save_member_roles(guild_id, 2000 + args.index, [1000 + args.index])
+        await db.stickyroles.flush_member_roles()
+        # The others have to see the newer row first for the older timestamp to land behind their position.
+        await asyncio.sleep(args.interval * 3)
+
+        path = os.path.join(os.path.dirname(args.database), f"import-{args.index}.ndjson")
+        with open(path, "w") as file:
+            file.write(json.dumps({"format": FORMAT_NAME, "version": FORMAT_VERSION}) + "\n")
+            file.write(json.dumps({
+                "type": "member_roles", "guild_id": guild_id, "user_id": 3000 + args.index,
+                "role_ids": [1000 + args.index], "updated_at": "2001-01-01 00:00:00"
+            }) + "\n")
+        await db.transfer.import_ndjson(path)
+
+        deadline = time.time() + args.timeout
+        while True:
+            missing = []
+            for index, other_guild_id in enumerate(guilds):
+                if 1000 + index not in await db.autoroles.get(other_guild_id):
+                    missing.append(f"autorole {1000 + index}")
+                for user_id in (2000 + index, 3000 + index):
+                    if not await db.stickyroles.get_member_roles(other_guild_id, user_id):
+                        missing.append(f"member {user_id}")
+            if not missing or time.time() > deadline:
+                break
+            await asyncio.sleep(args.interval)
+
+        if missing:
+            print(f"worker {args.index}: FAILED, missing {', '.join(missing)}", flush=True)
+            return 1
+        print(f"worker {args.index}: ok, {db.bus.received} invalidations received", flush=True)
+        return 0
+    finally:
+        await db.close()
+
+async def prepare(database, shards):
+    db = DatabaseManager(database, shards=shards, metrics_interval=0)
+    await db.setup()
+    await db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that several EzRoles processes sharing one database see each other's changes.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of processes to start")
+    parser.add_argument("--shards", type=int, default=2, help="Number of database shards")
+    parser.add_argument("--interval", type=float, default=0.2, help="Invalidation poll interval in seconds")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds each process waits for the others' changes")
+    parser.add_argument("--database", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--index", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, default=0.0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.index is not None:
+        sys.exit(asyncio.run(worker(args)))
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "ezroles.db")
+        asyncio.run(prepare(database, args.shards))
+
+        # Every worker writes at the same moment, after all of them have loaded their caches and filters.
+        start_at = time.time() + 3.0
+        processes = [
+            subprocess.Popen([
+                sys.executable, "-m", "utils.InvalidationCheck",
+                "--workers", str(args.workers), "--shards", str(args.shards),
+                "--interval", str(args.interval), "--timeout", str(args.timeout),
+                "--database", database, "--index", str(index), "--start-at", str(start_at)
+            ])
+            for index in range(args.workers)
+        ]
+        failed = sum(process.wait() != 0 for process in processes)
+
+    if failed:
+        print(f"{failed} of {args.workers} processes missed changes made by the others")
+        sys.exit(1)
+    print(f"All {args.workers} processes saw every change")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import asyncio
+import discord
+from utils.logger import get_logger
+
+logger = get_logger("memberchunker")
+
+class MemberChunker:
+    """Requests guild member lists on demand, one guild at a time, only where a feature needs them."""
+
+    def __init__(self, bot: discord.Bot, interval=1.0, timeout=60.0):
+        self.bot = bot
+        self.interval = interval
+        self.timeout = timeout
+        self.chunked = set()
+        self.pending = set()
+        self.queue = asyncio.Queue()
+        self.task = None
+        self.requests = 0
+
+        for event in ("on_guild_join", "on_guild_available", "on_guild_unavailable", "on_guild_remove"):
+            bot.add_listener(getattr(self, event), event)
+
+    def is_chunked(self, guild: discord.Guild) -> bool:
+        return guild.id in self.chunked
+
+    async def needs_members(self, guild: discord.Guild) -> bool:
+        if await self.bot.db.statusroles.get(guild.id):
+            return True
+        return await self.bot.db.stickyroles.get_feature_status(guild.id)
+
+    def request(self, guild: discord.Guild):
+        if guild.id in self.chunked or guild.id in self.pending:
+            return
+
+        self.pending.add(guild.id)
+        self.queue.put_nowait(guild.id)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._worker())
+
+    async def request_if_needed(self, guild: discord.Guild):
+        try:
+            if guild.id not in self.chunked and await self.needs_members(guild):
+                self.request(guild)
+        except Exception as e:
+            logger.error(f"Error checking whether guild {guild.id} needs members: {e}")
+
+    def invalidate(self, guild_id: int):
+        self.chunked.discard(guild_id)
+
+    async def _worker(self):
+        while not self.queue.empty():
+            guild_id = self.queue.get_nowait()
+            self.pending.discard(guild_id)
+
+            guild = self.bot.get_guild(guild_id)
+            if guild is None or guild.unavailable or guild_id in self.chunked:
+                continue
+
+            try:
+                # Without a member cache the tracker reads the chunks from the raw payloads.
+                await asyncio.wait_for(guild.chunk(cache=self.bot.member_tracker is None), timeout=self.timeout)
+                self.chunked.add(guild_id)
+                self.requests += 1
+                self.bot.dispatch("members_chunked", guild)
+            except asyncio.TimeoutError:
+                logger.error(f"Timed out chunking members for guild {guild_id}")
+            except Exception as e:
+                logger.error(f"Error chunking members for guild {guild_id}: {e}")
+
+            await asyncio.sleep(self.interval)
+
+    async def on_guild_join(self, guild: discord.Guild):
+        await self.request_if_needed(guild)
+
+    async def on_guild_available(self, guild: discord.Guild):
+        # A guild that becomes available again comes with a fresh, empty member list.
+        self.invalidate(guild.id)
+        await self.request_if_needed(guild)
+
+    async def on_guild_unavailable(self, guild: discord.Guild):
+        self.invalidate(guild.id)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.invalidate(guild.id)
@@ -0,0 +1,127 @@
+import discord
+from utils.logger import get_logger
+
+logger = get_logger("membertracker")
+
+CUSTOM_ACTIVITY_TYPE = 4
+
+def custom_status(activities) -> str | None:
+    for activity in activities or ():
+        if activity.get("type") == CUSTOM_ACTIVITY_TYPE and activity.get("state"):
+            return activity["state"]
+    return None
+
+class MemberRoleTracker:
+    """Role and custom status state of uncached members, fed from raw gateway payloads."""
+
+    def __init__(self, bot: discord.Bot):
+        self.bot = bot
+        self.members = {}
+        self.statuses = {}
+        self.role_sets = {}
+
+    def install(self):
+        parsers = self.bot._connection.parsers
+        for event, hook in (
+            ("GUILD_CREATE", self._on_guild_create),
+            ("GUILD_DELETE", self._on_guild_delete),
+            ("GUILD_MEMBERS_CHUNK", self._on_members_chunk),
+            ("GUILD_MEMBER_ADD", self._on_member_data),
+            ("GUILD_MEMBER_UPDATE", self._on_member_data),
+            ("GUILD_MEMBER_REMOVE", self._on_member_remove),
+            ("PRESENCE_UPDATE", self._on_presence_update),
+        ):
+            parsers[event] = self._wrap(parsers[event], hook)
+
+    def _wrap(self, parser, hook):
+        def wrapped(data):
+            try:
+                hook(data)
+            except Exception as e:
+                logger.error(f"Error tracking gateway payload: {e}")
+            return parser(data)
+        return wrapped
+
+    def _intern(self, role_ids) -> tuple[int, ...]:
+        key = tuple(sorted(int(role_id) for role_id in role_ids))
+        return self.role_sets.setdefault(key, key)
+
+    def set_roles(self, guild_id: int, user_id: int, role_ids):
+        self.members.setdefault(guild_id, {})[user_id] = self._intern(role_ids)
+
+    def get_roles(self, guild_id: int, user_id: int) -> tuple[int, ...] | None:
+        return self.members.get(guild_id, {}).get(user_id)
+
+    def add_role(self, guild_id: int, user_id: int, role_id: int):
+        role_ids = self.get_roles(guild_id, user_id) or ()
+        if role_id not in role_ids:
+            self.set_roles(guild_id, user_id, (*role_ids, role_id))
+
+    def remove_role(self, guild_id: int, user_id: int, role_id: int):
+        role_ids = self.get_roles(guild_id, user_id)
+        if role_ids and role_id in role_ids:
+            self.set_roles(guild_id, user_id, [existing for existing in role_ids if existing != role_id])
+
+    def set_status(self, guild_id: int, user_id: int, status: str | None):
+        statuses = self.statuses.setdefault(guild_id, {})
+        if status:
+            statuses[user_id] = status
+        else:
+            statuses.pop(user_id, None)
+
+    def get_status(self, guild_id: int, user_id: int) -> str | None:
+        return self.statuses.get(guild_id, {}).get(user_id)
+
+    def guild_members(self, guild_id: int) -> dict:
+        return self.members.get(guild_id, {})
+
+    def guild_statuses(self, guild_id: int) -> dict:
+        return self.statuses.get(guild_id, {})
+
+    def forget(self, guild_id: int, user_id: int) -> tuple[int, ...] | None:
+        self.statuses.get(guild_id, {}).pop(user_id, None)
+        return self.members.get(guild_id, {}).pop(user_id, None)
+
+    def _track(self, guild_id: int, data: dict):
+        user = data.get("user") or {}
+        if user.get("bot") or "roles" not in data:
+            return
+        self.set_roles(guild_id, int(user["id"]), data["roles"])
+
+    def _on_guild_create(self, data):
+        guild_id = int(data["id"])
+        for member in data.get("members", ()):
+            self._track(guild_id, member)
+
+    def _on_guild_delete(self, data):
+        if not data.get("unavailable"):
+            self.members.pop(int(data["id"]), None)
+            self.statuses.pop(int(data["id"]), None)
+
+    def _on_members_chunk(self, data):
+        guild_id = int(data["guild_id"])
+        for member in data.get("members", ()):
+            self._track(guild_id, member)
+        for presence in data.get("presences", ()) or ():
+            self.set_status(guild_id, int(presence["user"]["id"]), custom_status(presence.get("activities")))
+
+    def _on_member_data(self, data):
+        self._track(int(data["guild_id"]), data)
+
+    def _on_member_remove(self, data):
+        guild_id = int(data["guild_id"])
+        user = data["user"]
+        role_ids = self.forget(guild_id, int(user["id"]))
+        if role_ids is not None and not user.get("bot"):
+            self.bot.dispatch("tracked_member_remove", guild_id, int(user["id"]), role_ids)
+
+    def _on_presence_update(self, data):
+        guild_id = int(data["guild_id"])
+        guild = self.bot.get_guild(guild_id)
+        user_id = int(data["user"]["id"])
+        if guild is None or guild.get_member(user_id) is not None:
+            return
+
+        if "roles" in data:
+            self.set_roles(guild_id, user_id, data["roles"])
+        self.bot.dispatch("raw_presence_update", guild, user_id, custom_status(data.get("activities")), data.get("status") == "offline")
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import gc
+import random
+import tracemalloc
+import discord
+from discord.state import ConnectionState
+from utils.MemberTracker import MemberRoleTracker
+
+def role_payloads(count):
+    return [
+        {
+            "id": str(10**17 + index), "name": f"role{index}", "position": index, "permissions": "0",
+            "color": 0, "colors": {"primary_color": 0}, "hoist": False, "managed": False, "mentionable": False
+        }
+        for index in range(count)
+    ]
+
+def member_payloads(rng, role_ids, count, max_roles):
+    return [
+        {
+            "user": {
+                "id": str(2 * 10**17 + index), "username": f"user{index}", "discriminator": "0",
+                "avatar": "a" * 32, "global_name": f"User {index}"
+            },
+            "roles": rng.sample(role_ids, rng.randint(0, max_roles)),
+            "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "nick": None
+        }
+        for index in range(count)
+    ]
+
+def measure(fill):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = fill()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0], kept
+    finally:
+        tracemalloc.stop()
+
+async def run(args):
+    rng = random.Random(args.seed)
+    roles = role_payloads(args.roles)
+    members = member_payloads(rng, [role["id"] for role in roles], args.members, args.max_roles)
+
+    # The same structures the gateway parsers fill for a guild in each mode, without a connection.
+    state = ConnectionState(
+        dispatch=lambda *args: None, handlers={}, hooks={}, http=None, loop=asyncio.get_running_loop(),
+        intents=discord.Intents.all(), member_cache_flags=discord.MemberCacheFlags.all()
+    )
+    guild = discord.Guild(data={"id": "1", "name": "benchmark", "roles": roles}, state=state)
+
+    def fill_cache():
+        for data in members:
+            guild._add_member(discord.Member(data=data, guild=guild, state=state))
+            state.store_user(data["user"])
+        return guild
+
+    def fill_tracker():
+        tracker = MemberRoleTracker(None)
+        for data in members:
+            tracker._track(1, data)
+        return tracker
+
+    cached, _ = measure(fill_cache)
+    tracked, tracker = measure(fill_tracker)
+    print(
+        f"members={args.members} roles={args.roles} member cache={cached / 2**20:.1f} MiB "
+        f"low-memory tracker={tracked / 2**20:.1f} MiB role sets={len(tracker.role_sets)}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare member memory in cached mode and low-memory mode.")
+    parser.add_argument("--members", type=int, default=100_000, help="Members in the synthetic guild")
+    parser.add_argument("--roles", type=int, default=40, help="Roles in the synthetic guild")
+    parser.add_argument("--max-roles", type=int, default=4, help="Most roles given to one member")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
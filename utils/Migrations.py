@@ -0,0 +1,309 @@
+import aiosqlite
+import os
+import json
+import logging
+from utils.RoleSets import intern_role_ids, backup_role_hash, BACKUP_ROLE_FIELDS, SET_REFERENCE_SIZE
+
+logger = logging.getLogger("database")
+
+LEGACY_DATABASES = {
+    "autorole.db": ["autoroles"],
+    "statusrole.db": ["statusroles"],
+    "stickyroles.db": ["guild_settings", "member_roles"],
+    "rolebackup.db": ["role_backups"],
+}
+
+async def initial_schema(db, db_path, owns_guild):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS autoroles (
+            guild_id INTEGER,
+            role_id INTEGER,
+            added_by INTEGER,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (guild_id, role_id)
+        )
+    ''')
+
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS statusroles (
+            guild_id INTEGER,
+            role_id INTEGER,
+            status_text TEXT,
+            added_by INTEGER,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (guild_id, role_id, status_text)
+        )
+    ''')
+
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER PRIMARY KEY,
+            is_enabled BOOLEAN DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS member_roles (
+            guild_id INTEGER,
+            user_id INTEGER,
+            role_ids TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (guild_id, user_id)
+        )
+    ''')
+
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS role_backups (
+            guild_id INTEGER PRIMARY KEY,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            roles_data TEXT
+        )
+    ''')
+
+async def import_legacy_databases(db, db_path, owns_guild, chunk_size=1000):
+    directory = os.path.dirname(db_path)
+
+    for filename, tables in LEGACY_DATABASES.items():
+        legacy_path = os.path.join(directory, filename)
+        if not os.path.exists(legacy_path) or os.path.abspath(legacy_path) == os.path.abspath(db_path):
+            continue
+
+        async with aiosqlite.connect(legacy_path) as legacy:
+            for table in tables:
+                cursor = await legacy.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    (table,)
+                )
+                if not await cursor.fetchone():
+                    continue
+
+                cursor = await legacy.execute(f"SELECT * FROM {table}")
+                columns = [column[0] for column in cursor.description]
+                placeholders = ','.join(['?'] * len(columns))
+                imported = 0
+
+                while True:
+                    rows = await cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+
+                    guild_column = columns.index("guild_id")
+                    rows = [row for row in rows if owns_guild(row[guild_column])]
+
+                    await db.executemany(
+                        f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                        rows
+                    )
+                    imported += len(rows)
+
+                logger.info(f"Imported {imported} rows into {table} from legacy database {filename}")
+
+async def intern_member_role_sets(db, db_path, owns_guild, chunk_size=1000):
+    await db.execute('''
+        CREATE TABLE role_sets (
+            set_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            role_ids BLOB NOT NULL
+        )
+    ''')
+    await db.execute("CREATE INDEX idx_role_sets_guild ON role_sets (guild_id)")
+
+    await db.execute('''
+        CREATE TABLE member_roles_interned (
+            guild_id INTEGER,
+            user_id INTEGER,
+            role_set_id INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (guild_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+
+    saved_bytes = {}
+    known_sets = set()
+    cursor = await db.execute("SELECT guild_id, user_id, role_ids, updated_at FROM member_roles")
+
+    while True:
+        rows = await cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+
+        role_sets = []
+        members = []
+        for guild_id, user_id, role_json, updated_at in rows:
+            try:
+                role_ids = json.loads(role_json)
+            except (TypeError, json.JSONDecodeError):
+                logger.error(f"Dropping undecodable role JSON for user {user_id} in guild {guild_id}")
+                continue
+
+            set_id, blob = intern_role_ids(guild_id, role_ids)
+            saved = len(role_json) - SET_REFERENCE_SIZE
+            if set_id not in known_sets:
+                known_sets.add(set_id)
+                role_sets.append((set_id, guild_id, blob))
+                saved -= len(blob)
+            saved_bytes[guild_id] = saved_bytes.get(guild_id, 0) + saved
+            members.append((guild_id, user_id, set_id, updated_at))
+
+        await db.executemany(
+            "INSERT OR IGNORE INTO role_sets (set_id, guild_id, role_ids) VALUES (?, ?, ?)",
+            role_sets
+        )
+        await db.executemany(
+            "INSERT INTO member_roles_interned (guild_id, user_id, role_set_id, updated_at) VALUES (?, ?, ?, ?)",
+            members
+        )
+
+    await db.execute("DROP TABLE member_roles")
+    await db.execute("ALTER TABLE member_roles_interned RENAME TO member_roles")
+
+    for guild_id, saved in sorted(saved_bytes.items(), key=lambda item: item[1], reverse=True):
+        logger.info(f"Interned sticky role sets for guild {guild_id}: {saved} bytes saved")
+    logger.info(f"Interned sticky role sets: {len(known_sets)} distinct sets, {sum(saved_bytes.values())} bytes saved in total")
+
+async def version_role_backups(db, db_path, owns_guild):
+    await db.execute('''
+        CREATE TABLE backup_snapshots (
+            snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            role_count INTEGER DEFAULT 0
+        )
+    ''')
+    await db.execute("CREATE INDEX idx_backup_snapshots_guild ON backup_snapshots (guild_id, snapshot_id)")
+
+    await db.execute('''
+        CREATE TABLE backup_roles (
+            role_hash INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            id INTEGER,
+            name TEXT,
+            color INTEGER,
+            hoist BOOLEAN,
+            position INTEGER,
+            permissions INTEGER,
+            mentionable BOOLEAN
+        )
+    ''')
+    await db.execute("CREATE INDEX idx_backup_roles_guild ON backup_roles (guild_id)")
+
+    await db.execute('''
+        CREATE TABLE backup_snapshot_roles (
+            snapshot_id INTEGER,
+            role_hash INTEGER,
+            PRIMARY KEY (snapshot_id, role_hash)
+        ) WITHOUT ROWID
+    ''')
+
+    cursor = await db.execute("SELECT guild_id, created_by, created_at, roles_data FROM role_backups")
+    for guild_id, created_by, created_at, roles_json in await cursor.fetchall():
+        try:
+            roles_data = json.loads(roles_json)
+        except (TypeError, json.JSONDecodeError):
+            logger.error(f"Dropping undecodable role backup for guild {guild_id}")
+            continue
+
+        snapshot = await db.execute(
+            "INSERT INTO backup_snapshots (guild_id, created_by, created_at, role_count) VALUES (?, ?, ?, ?)",
+            (guild_id, created_by, created_at, len(roles_data))
+        )
+        hashes = [backup_role_hash(guild_id, role_data) for role_data in roles_data]
+        await db.executemany(
+            f"INSERT OR IGNORE INTO backup_roles (role_hash, guild_id, {', '.join(BACKUP_ROLE_FIELDS)}) VALUES (?, ?, {','.join(['?'] * len(BACKUP_ROLE_FIELDS))})",
+            [
+                (role_hash, guild_id, *(role_data.get(field) for field in BACKUP_ROLE_FIELDS))
+                for role_hash, role_data in zip(hashes, roles_data)
+            ]
+        )
+        await db.executemany(
+            "INSERT OR IGNORE INTO backup_snapshot_roles (snapshot_id, role_hash) VALUES (?, ?)",
+            [(snapshot.lastrowid, role_hash) for role_hash in hashes]
+        )
+
+    await db.execute("DROP TABLE role_backups")
+
+async def data_lifecycle(db, db_path, owns_guild):
+    await db.execute('''
+        CREATE TABLE pending_purges (
+            guild_id INTEGER PRIMARY KEY,
+            purge_after TIMESTAMP NOT NULL
+        )
+    ''')
+    await db.execute("CREATE INDEX idx_member_roles_updated ON member_roles (updated_at)")
+
+async def config_versions(db, db_path, owns_guild):
+    await db.execute('''
+        CREATE TABLE config_versions (
+            feature TEXT NOT NULL,
+            guild_id INTEGER NOT NULL,
+            changed_at REAL NOT NULL,
+            PRIMARY KEY (feature, guild_id)
+        ) WITHOUT ROWID
+    ''')
+    await db.execute("CREATE INDEX idx_config_versions_changed ON config_versions (changed_at)")
+
+async def config_change_log(db, db_path, owns_guild):
+    await db.execute("ALTER TABLE config_versions ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+    await db.execute("ALTER TABLE config_versions ADD COLUMN origin TEXT")
+    await db.execute("CREATE INDEX idx_config_versions_seq ON config_versions (seq)")
+
+async def member_change_sequence(db, db_path, owns_guild):
+    await db.execute("ALTER TABLE member_roles ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+    await db.execute("CREATE INDEX idx_member_roles_seq ON member_roles (seq)")
+    await db.execute('''
+        CREATE TABLE member_roles_seq (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL
+        )
+    ''')
+    await db.execute("INSERT INTO member_roles_seq (id, seq) VALUES (1, 0)")
+
+async def member_role_set_index(db, db_path, owns_guild):
+    # Removing a role remaps every member of each affected set; without this each remap scans the guild.
+    await db.execute("CREATE INDEX idx_member_roles_set ON member_roles (guild_id, role_set_id)")
+
+MIGRATIONS = [
+    (1, "initial schema", initial_schema),
+    (2, "import legacy per-feature databases", import_legacy_databases),
+    (3, "intern sticky member role sets", intern_member_role_sets),
+    (4, "versioned, deduplicated role backups", version_role_backups),
+    (5, "data lifecycle tables", data_lifecycle),
+    (6, "configuration change timestamps", config_versions),
+    (7, "configuration change sequence for cross-process invalidation", config_change_log),
+    (8, "sticky member change sequence", member_change_sequence),
+    (9, "index sticky members by role set", member_role_set_index),
+]
+
+async def get_schema_version(db):
+    cursor = await db.execute("PRAGMA user_version")
+    result = await cursor.fetchone()
+    return result[0]
+
+async def run_migrations(db, db_path, owns_guild, import_legacy=True):
+    current_version = await get_schema_version(db)
+
+    for version, description, migration in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        logger.info(f"Applying database migration {version}: {description}")
+        try:
+            await db.execute("BEGIN")
+            if migration is import_legacy_databases and not import_legacy:
+                # Legacy files stay on disk after the first import; importing them into a later shard would resurrect old data.
+                logger.info("Skipping legacy database import for a shard created after the first migration")
+            else:
+                await migration(db, db_path, owns_guild)
+            await db.execute(f"PRAGMA user_version = {version}")
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            logger.critical(f"Database migration {version} failed")
+            raise
+
+        current_version = version
+
+    return current_version
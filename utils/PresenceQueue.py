@@ -0,0 +1,79 @@
+import asyncio
+from collections import OrderedDict, deque
+
+class PresenceQueue:
+    """Bounded per-guild queue that keeps only the latest pending presence of each member."""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.guilds = {}
+        self.ready = deque()
+        self.size = 0
+        self.available = asyncio.Event()
+        self.coalesced = 0
+        self.dropped = 0
+        self.processed = 0
+
+    def put(self, guild_id: int, user_id: int, item) -> tuple[int, int] | None:
+        pending = self.guilds.get(guild_id)
+        if pending is None:
+            pending = self.guilds[guild_id] = OrderedDict()
+            self.ready.append(guild_id)
+
+        if user_id in pending:
+            pending[user_id] = item
+            self.coalesced += 1
+            return None
+
+        shed = self._shed(guild_id) if self.size >= self.max_size else None
+        pending[user_id] = item
+        self.size += 1
+        self.available.set()
+        return shed
+
+    def _shed(self, guild_id: int) -> tuple[int, int]:
+        # Shed from the larger of the overflowing guild and the next guild in line, so a flooding guild pays first.
+        pending = self.guilds[guild_id]
+        candidate_id = self.ready[0]
+        candidate = self.guilds[candidate_id]
+
+        if len(candidate) <= len(pending):
+            # Refilled by the caller right after, so it stays queued even if this empties it.
+            user_id, _ = pending.popitem(last=False)
+        else:
+            guild_id = candidate_id
+            user_id, _ = candidate.popitem(last=False)
+            if not candidate:
+                del self.guilds[guild_id]
+                self.ready.popleft()
+
+        self.size -= 1
+        self.dropped += 1
+        return guild_id, user_id
+
+    async def get(self):
+        while not self.size:
+            self.available.clear()
+            await self.available.wait()
+
+        # Guilds take turns, one member at a time.
+        guild_id = self.ready.popleft()
+        pending = self.guilds[guild_id]
+        user_id, item = pending.popitem(last=False)
+        self.size -= 1
+        self.processed += 1
+
+        if pending:
+            self.ready.append(guild_id)
+        else:
+            del self.guilds[guild_id]
+        return guild_id, user_id, item
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.size,
+            "guilds": len(self.guilds),
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "processed": self.processed
+        }
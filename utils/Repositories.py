@@ -0,0 +1,1005 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from utils.BloomFilter import BloomFilter
+from utils.ConfigCache import MISSING
+from utils.DatabaseMetrics import instrumented
+from utils.RoleSets import (
+    intern_role_ids,
+    unpack_role_ids,
+    json_size,
+    backup_role_hash,
+    BACKUP_ROLE_FIELDS,
+    SET_REFERENCE_SIZE,
+)
+
+logger = logging.getLogger("database")
+
+class Repository:
+    name = "repository"
+
+    def __init__(self, db):
+        self.db = db
+
+    async def load_config(self, shard: int) -> dict:
+        return {}
+
+    async def record_change(self, db, guild_id: int, feature: str | None = None):
+        await db.execute(
+            """
+            INSERT INTO config_versions (feature, guild_id, changed_at, seq, origin)
+            VALUES (?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM config_versions), ?)
+            ON CONFLICT (feature, guild_id) DO UPDATE
+            SET changed_at = excluded.changed_at, seq = excluded.seq, origin = excluded.origin
+            """,
+            (feature or self.name, guild_id, time.time(), self.db.process_id)
+        )
+
+    @property
+    def cache(self):
+        return self.db.config_cache
+
+class AutoRoleRepository(Repository):
+    name = "autoroles"
+
+    async def add(self, guild_id: int, role_id: int, author_id: int) -> bool:
+        return role_id in await self.add_many(guild_id, [role_id], author_id)
+
+    @instrumented
+    async def add_many(self, guild_id: int, role_ids: list[int], author_id: int) -> list[int]:
+        role_ids = list(dict.fromkeys(role_ids))
+        if not role_ids:
+            return []
+
+        async with self.db.transaction(guild_id) as batch:
+            added = await batch.insert_new(
+                "autoroles", ("guild_id", "role_id", "added_by"),
+                [(guild_id, role_id, author_id) for role_id in role_ids],
+                conflict=("guild_id", "role_id"), returning="role_id"
+            )
+            if added:
+                await self.record_change(batch.db, guild_id)
+        if added:
+            self.cache.invalidate(self.name, guild_id)
+        return added
+
+    @instrumented
+    async def remove(self, guild_id: int, role_id: int) -> bool:
+        async with self.db.write(guild_id) as db:
+            cursor = await db.execute(
+                "DELETE FROM autoroles WHERE guild_id = ? AND role_id = ?",
+                (guild_id, role_id)
+            )
+            removed = cursor.rowcount > 0
+            if removed:
+                await self.record_change(db, guild_id)
+        if removed:
+            self.cache.invalidate(self.name, guild_id)
+        return removed
+
+    @instrumented
+    async def get(self, guild_id: int) -> list[int]:
+        cached = self.cache.get(self.name, guild_id, empty=())
+        if cached is not MISSING:
+            return list(cached)
+
+        token = self.cache.token()
+        async with self.db.read(guild_id) as db:
+            cursor = await db.execute(
+                "SELECT role_id FROM autoroles WHERE guild_id = ?",
+                (guild_id,)
+            )
+            roles = tuple(role[0] for role in await cursor.fetchall())
+
+        self.cache.set(self.name, guild_id, roles, token)
+        return list(roles)
+
+    async def load_config(self, shard: int) -> dict:
+        config = {}
+        async with self.db.read(shard=shard) as db:
+            cursor = await db.execute("SELECT guild_id, role_id FROM autoroles ORDER BY guild_id")
+            for guild_id, role_id in await cursor.fetchall():
+                config.setdefault(guild_id, []).append(role_id)
+        return {guild_id: tuple(role_ids) for guild_id, role_ids in config.items()}
+
+    @instrumented
+    async def clear(self, guild_id: int) -> int:
+        async with self.db.write(guild_id) as db:
+            cursor = await db.execute(
+                "DELETE FROM autoroles WHERE guild_id = ?",
+                (guild_id,)
+            )
+            removed = cursor.rowcount
+            if removed:
+                await self.record_change(db, guild_id)
+        if removed:
+            self.cache.invalidate(self.name, guild_id)
+        return removed
+
+    @instrumented
+    async def remove_nonexisting(self, guild_id: int, valid_role_ids: list[int]) -> int:
+        if not valid_role_ids:
+            return await self.clear(guild_id)
+
+        placeholders = ','.join(['?'] * len(valid_role_ids))
+        async with self.db.write(guild_id) as db:
+            cursor = await db.execute(
+                f"DELETE FROM autoroles WHERE guild_id = ? AND role_id NOT IN ({placeholders})",
+                (guild_id, *valid_role_ids)
+            )
+            removed = cursor.rowcount
+            if removed:
+                await self.record_change(db, guild_id)
+        if removed:
+            self.cache.invalidate(self.name, guild_id)
+        return removed
+
+class StatusRoleRepository(Repository):
+    name = "statusroles"
+
+    async def add(self, guild_id: int, role_id: int, status_text: str, author_id: int) -> bool:
+        return role_id in await self.add_many(guild_id, [role_id], status_text, author_id)
+
+    @instrumented
+    async def add_many(self, guild_id: int, role_ids: list[int], status_text: str, author_id: int) -> list[int]:
+        role_ids = list(dict.fromkeys(role_ids))
+        if not role_ids:
+            return []
+
+        async with self.db.transaction(guild_id) as batch:
+            added = await batch.insert_new(
+                "statusroles", ("guild_id", "role_id", "status_text", "added_by"),
+                [(guild_id, role_id, status_text, author_id) for role_id in role_ids],
+                conflict=("guild_id", "role_id", "status_text"), returning="role_id"
+            )
+            if added:
+                await self.record_change(batch.db, guild_id)
+        if added:
+            self.cache.invalidate(self.name, guild_id)
+        return added
+
+    @instrumented
+    async def remove(self, guild_id: int, role_id: int, status_text: str) -> bool:
+        async with self.db.write(guild_id) as db:
+            cursor = await db.execute(
+                "DELETE FROM statusroles WHERE guild_id = ? AND role_id = ? AND status_text = ?",
+                (guild_id, role_id, status_text)
+            )
+            removed = cursor.rowcount > 0
+            if removed:
+                await self.record_change(db, guild_id)
+        if removed:
+            self.cache.invalidate(self.name, guild_id)
+        return removed
+
+    @instrumented
+    async def remove_role(self, guild_id: int, role_id: int) -> bool:
+        async with self.db.write(guild_id) as db:
+            cursor = await db.execute(
+                "DELETE FROM statusroles WHERE guild_id = ? AND role_id = ?",
+                (guild_id, role_id)
+            )
+            removed = cursor.rowcount > 0
+            if removed:
+                await self.record_change(db, guild_id)
+        if removed:
+            self.cache.invalidate(self.name, guild_id)
+        return removed
+
+    @instrumented
+    async def get(self, guild_id: int) -> list[dict]:
+        mappings = self.cache.get(self.name, guild_id, empty=())
+        if mappings is MISSING:
+            token = self.cache.token()
+            async with self.db.read(guild_id) as db:
+                cursor = await db.execute(
+                    "SELECT role_id, status_text FROM statusroles WHERE guild_id = ?",
+                    (guild_id,)
+                )
+                mappings = tuple((role['role_id'], role['status_text']) for role in await cursor.fetchall())
+            self.cache.set(self.name, guild_id, mappings, token)
+
+        return [{'role_id': role_id, 'status_text': status_text} for role_id, status_text in mappings]
+
+    async def load_config(self, shard: int) -> dict:
+        config = {}
+        async with self.db.read(shard=shard) as db:
+            cursor = await db.execute("SELECT guild_id, role_id, status_text FROM statusroles ORDER BY guild_id")
+            for guild_id, role_id, status_text in await cursor.fetchall():
+                config.setdefault(guild_id, []).append((role_id, status_text))
+        return {guild_id: tuple(mappings) for guild_id, mappings in config.items()}
+
+    @instrumented
+    async def clear(self, guild_id: int) -> int:
+        async with self.db.write(guild_id) as db:
+            cursor = await db.execute(
+                "DELETE FROM statusroles WHERE guild_id = ?",
+                (guild_id,)
+            )
+            removed = cursor.rowcount
+            if removed:
+                await self.record_change(db, guild_id)
+        if removed:
+            self.cache.invalidate(self.name, guild_id)
+        return removed
+
+    @instrumented
+    async def remove_nonexisting(self, guild_id: int, valid_role_ids: list[int]) -> int:
+        if not valid_role_ids:
+            return await self.clear(guild_id)
+
+        placeholders = ','.join(['?'] * len(valid_role_ids))
+        async with self.db.write(guild_id) as db:
+            cursor = await db.execute(
+                f"DELETE FROM statusroles WHERE guild_id = ? AND role_id NOT IN ({placeholders})",
+                (guild_id, *valid_role_ids)
+            )
+            removed = cursor.rowcount
+            if removed:
+                await self.record_change(db, guild_id)
+        if removed:
+            self.cache.invalidate(self.name, guild_id)
+        return removed
+
+class StickyRoleRepository(Repository):
+    name = "stickyroles"
+
+    def __init__(self, db, flush_size: int = 500, flush_interval: float = 2.0,
+                 filter_error_rate: float = 0.01, filter_min_capacity: int = 100000):
+        super().__init__(db)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.pending_member_roles = {}
+        self.flushing_member_roles = {}
+        self.flush_lock = asyncio.Lock()
+        self.flush_stop = asyncio.Event()
+        self.flush_task = None
+
+        self.filter_error_rate = filter_error_rate
+        self.filter_min_capacity = filter_min_capacity
+        self.member_filter = None
+        self.filter_stamp = None
+        self.filter_backlog = None
+        self.filter_task = None
+        self.filter_skipped = 0
+        self.filter_false_positives = 0
+
+    def start(self):
+        if self.flush_task is None:
+            self.flush_stop.clear()
+            self.flush_task = asyncio.create_task(self._flush_loop())
+        if self.filter_task is None and self.filter_error_rate:
+            self.filter_task = asyncio.create_task(self._load_member_filter())
+
+    async def stop(self):
+        if self.flush_task is not None:
+            # Cancelling could interrupt a flush halfway, so let the loop finish its current one and exit.
+            self.flush_stop.set()
+            await self.flush_task
+            self.flush_task = None
+        if self.filter_task is not None:
+            self.filter_task.cancel()
+            self.filter_task = None
+
+        await self.flush_member_roles()
+
+        if self.member_filter is not None:
+            try:
+                self.member_filter.save(self.filter_path, await self._closing_filter_stamp())
+            except Exception as e:
+                logger.error(f"Error saving member filter: {e}")
+
+    async def _flush_loop(self):
+        while not self.flush_stop.is_set():
+            try:
+                await asyncio.wait_for(self.flush_stop.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush_member_roles()
+            except Exception as e:
+                logger.error(f"Error flushing queued member roles: {e}")
+
+    @property
+    def filter_path(self):
+        return f"{os.path.splitext(self.db.db_path)[0]}.members.bloom"
+
+    def remember_member(self, guild_id: int, user_id: int):
+        if self.member_filter is not None:
+            self.member_filter.add(guild_id, user_id)
+        if self.filter_backlog is not None:
+            self.filter_backlog.add((guild_id, user_id))
+
+    async def _member_filter_stamp(self):
+        digest = hashlib.blake2b(digest_size=16)
+        stored = 0
+        latest_seqs = []
+        for shard in range(self.db.shards):
+            async with self.db.read(shard=shard) as db:
+                cursor = await db.execute("SELECT COUNT(*), COALESCE(MAX(seq), 0) FROM member_roles")
+                count, latest = await cursor.fetchone()
+            digest.update(f"{shard}:{count}:{latest};".encode())
+            stored += count
+            latest_seqs.append(latest)
+        return digest.digest(), stored, latest_seqs
+
+    async def _closing_filter_stamp(self):
+        # Our own saves are all in the filter; other processes' rows only up to where the bus has synced.
+        bus = self.db.bus
+        if bus.enabled:
+            if not bus.connections:
+                return self.filter_stamp
+            await bus.poll()
+
+        stamp, _, latest_seqs = await self._member_filter_stamp()
+        if bus.enabled and latest_seqs != bus.last_member_seq:
+            return self.filter_stamp
+        return stamp
+
+    async def _load_member_filter(self):
+        try:
+            await self.rebuild_member_filter(reuse_saved=True)
+        except Exception as e:
+            logger.error(f"Error loading member filter: {e}")
+
+    async def rebuild_member_filter(self, reuse_saved: bool = False) -> int:
+        # Members saved from here on are collected, so none fall between the stamp and the new filter.
+        self.filter_backlog = set()
+        try:
+            stamp, stored, _ = await self._member_filter_stamp()
+            bloom = BloomFilter.load(self.filter_path, stamp, self.filter_error_rate) if reuse_saved else None
+            if bloom is not None and bloom.count <= bloom.capacity:
+                logger.info(f"Loaded member filter with {bloom.count} entries from {self.filter_path}")
+            else:
+                bloom = BloomFilter(max(self.filter_min_capacity, stored * 2), self.filter_error_rate)
+                for shard in range(self.db.shards):
+                    async with self.db.read(shard=shard) as db:
+                        cursor = await db.execute("SELECT guild_id, user_id FROM member_roles")
+                        while True:
+                            rows = await cursor.fetchmany(10000)
+                            if not rows:
+                                break
+                            for guild_id, user_id in rows:
+                                bloom.add(guild_id, user_id)
+                            await asyncio.sleep(0)
+                logger.info(f"Built member filter with {bloom.count} entries ({len(bloom.bits)} bytes)")
+
+            for key in [*self.pending_member_roles, *self.flushing_member_roles, *self.filter_backlog]:
+                bloom.add(*key)
+        finally:
+            self.filter_backlog = None
+
+        self.member_filter = bloom
+        self.filter_stamp = stamp
+        self.filter_skipped = 0
+        self.filter_false_positives = 0
+        return bloom.count
+
+    def observed_false_positive_rate(self) -> float:
+        negatives = self.filter_skipped + self.filter_false_positives
+        return self.filter_false_positives / negatives if negatives else 0.0
+
+    def member_filter_needs_rebuild(self) -> bool:
+        bloom = self.member_filter
+        if bloom is None:
+            return False
+        if bloom.count > bloom.capacity:
+            return True
+        samples = self.filter_skipped + self.filter_false_positives
+        return samples >= 1000 and self.observed_false_positive_rate() > self.filter_error_rate * 4
+
+    def member_filter_stats(self) -> dict:
+        bloom = self.member_filter
+        if bloom is None:
+            return {}
+        return {
+            "entries": bloom.count,
+            "capacity": bloom.capacity,
+            "bytes": len(bloom.bits),
+            "skipped_lookups": self.filter_skipped,
+            "false_positives": self.filter_false_positives,
+            "estimated_fpr": round(bloom.estimated_false_positive_rate(), 6),
+            "observed_fpr": round(self.observed_false_positive_rate(), 6),
+        }
+
+    @instrumented
+    async def set_feature_status(self, guild_id: int, is_enabled: bool) -> bool:
+        async with self.db.write(guild_id) as db:
+            cursor = await db.execute(
+                """
+                INSERT INTO guild_settings (guild_id, is_enabled) VALUES (?, ?)
+                ON CONFLICT (guild_id) DO UPDATE
+                SET is_enabled = excluded.is_enabled, updated_at = CURRENT_TIMESTAMP
+                WHERE is_enabled != excluded.is_enabled
+                RETURNING guild_id
+                """,
+                (guild_id, is_enabled)
+            )
+            changed = await cursor.fetchone() is not None
+            if changed:
+                await self.record_change(db, guild_id)
+        self.cache.invalidate(self.name, guild_id)
+        return changed
+
+    @instrumented
+    async def get_feature_status(self, guild_id: int) -> bool:
+        cached = self.cache.get(self.name, guild_id, empty=False)
+        if cached is not MISSING:
+            return cached
+
+        token = self.cache.token()
+        async with self.db.read(guild_id) as db:
+            cursor = await db.execute(
+                "SELECT is_enabled FROM guild_settings WHERE guild_id = ?",
+                (guild_id,)
+            )
+            result = await cursor.fetchone()
+
+        is_enabled = bool(result[0]) if result else False
+        self.cache.set(self.name, guild_id, is_enabled, token)
+        return is_enabled
+
+    async def load_config(self, shard: int) -> dict:
+        async with self.db.read(shard=shard) as db:
+            cursor = await db.execute("SELECT guild_id, is_enabled FROM guild_settings")
+            return {guild_id: bool(is_enabled) for guild_id, is_enabled in await cursor.fetchall()}
+
+    @instrumented
+    async def save_member_roles(self, guild_id: int, user_id: int, role_ids: list[int]) -> bool:
+        updated_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+        self.pending_member_roles[(guild_id, user_id)] = (list(role_ids), updated_at)
+        self.remember_member(guild_id, user_id)
+
+        if len(self.pending_member_roles) >= self.flush_size:
+            await self.flush_member_roles()
+        return True
+
+    @instrumented
+    async def flush_member_roles(self) -> int:
+        async with self.flush_lock:
+            if not self.pending_member_roles:
+                return 0
+
+            self.flushing_member_roles = self.pending_member_roles
+            self.pending_member_roles = {}
+
+            batches = {}
+            for (guild_id, user_id), (role_ids, updated_at) in self.flushing_member_roles.items():
+                set_id, blob = intern_role_ids(guild_id, role_ids)
+                role_sets, rows = batches.setdefault(self.db.shard_for(guild_id), ({}, []))
+                role_sets[set_id] = (set_id, guild_id, blob)
+                rows.append((guild_id, user_id, set_id, updated_at))
+
+            flushed = 0
+            committed_shards = set()
+            error = None
+            try:
+                for shard, (role_sets, rows) in batches.items():
+                    try:
+                        async with self.db.write(shard=shard) as db:
+                            await db.executemany(
+                                "INSERT OR IGNORE INTO role_sets (set_id, guild_id, role_ids) VALUES (?, ?, ?)",
+                                list(role_sets.values())
+                            )
+                            first_seq = await self.reserve_member_seq(db, len(rows))
+                            await db.executemany(
+                                """
+                                INSERT OR REPLACE INTO member_roles
+                                (guild_id, user_id, role_set_id, updated_at, seq)
+                                VALUES (?, ?, ?, ?, ?)
+                                """,
+                                [(*row, first_seq + index) for index, row in enumerate(rows)]
+                            )
+                        committed_shards.add(shard)
+                        flushed += len(rows)
+                    except Exception as e:
+                        error = e
+            finally:
+                # Whatever did not commit goes back into the queue, also when the flush was cancelled.
+                failed = {
+                    key: value for key, value in self.flushing_member_roles.items()
+                    if self.db.shard_for(key[0]) not in committed_shards
+                }
+                if failed:
+                    self.pending_member_roles = {**failed, **self.pending_member_roles}
+                self.flushing_member_roles = {}
+
+            if error is not None:
+                raise error
+            return flushed
+
+    async def reserve_member_seq(self, db, count: int) -> int:
+        # Numbers come from a counter that deleted rows cannot lower, so other processes never see one reused.
+        # Rows copied in by the rebalancer may already be ahead of this shard's counter.
+        cursor = await db.execute(
+            "UPDATE member_roles_seq SET seq = MAX(seq, (SELECT COALESCE(MAX(seq), 0) FROM member_roles)) + ? RETURNING seq",
+            (count,)
+        )
+        return (await cursor.fetchone())[0] - count + 1
+
+    @instrumented
+    async def get_member_roles(self, guild_id: int, user_id: int) -> list[int]:
+        key = (guild_id, user_id)
+        queued = self.pending_member_roles.get(key) or self.flushing_member_roles.get(key)
+        if queued:
+            return list(queued[0])
+
+        bloom = self.member_filter
+        if bloom is not None and key not in bloom:
+            self.filter_skipped += 1
+            return []
+
+        async with self.db.read(guild_id) as db:
+            cursor = await db.execute(
+                """
+                SELECT rs.role_ids
+                FROM member_roles m
+                JOIN role_sets rs ON rs.set_id = m.role_set_id
+                WHERE m.guild_id = ? AND m.user_id = ?
+                """,
+                (guild_id, user_id)
+            )
+            result = await cursor.fetchone()
+
+            if not result:
+                if bloom is not None:
+                    self.filter_false_positives += 1
+                return []
+
+            return unpack_role_ids(result[0])
+
+    def drop_pending(self, guild_id: int) -> int:
+        dropped = [key for key in self.pending_member_roles if key[0] == guild_id]
+        for key in dropped:
+            del self.pending_member_roles[key]
+        return len(dropped)
+
+    @instrumented
+    async def clear_member_roles(self, guild_id: int) -> int:
+        async with self.flush_lock:
+            dropped = self.drop_pending(guild_id)
+
+            async with self.db.write(guild_id) as db:
+                cursor = await db.execute(
+                    "DELETE FROM member_roles WHERE guild_id = ?",
+                    (guild_id,)
+                )
+                await db.execute(
+                    "DELETE FROM role_sets WHERE guild_id = ?",
+                    (guild_id,)
+                )
+                return cursor.rowcount + dropped
+
+    @instrumented
+    async def expire_member_roles(self, cutoff: datetime, batch_size: int = 500) -> int:
+        cutoff = cutoff.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        expired = 0
+        for shard in range(self.db.shards):
+            while True:
+                async with self.db.write(shard=shard) as db:
+                    cursor = await db.execute(
+                        """
+                        DELETE FROM member_roles
+                        WHERE (guild_id, user_id) IN (
+                            SELECT guild_id, user_id FROM member_roles
+                            WHERE updated_at < ?
+                            LIMIT ?
+                        )
+                        """,
+                        (cutoff, batch_size)
+                    )
+                    deleted = cursor.rowcount
+
+                expired += deleted
+                if deleted < batch_size:
+                    break
+                await asyncio.sleep(0)
+        return expired
+
+    @instrumented
+    async def collect_unused_role_sets(self) -> int:
+        deleted = 0
+        for shard in range(self.db.shards):
+            async with self.db.write(shard=shard) as db:
+                cursor = await db.execute(
+                    "DELETE FROM role_sets WHERE set_id NOT IN (SELECT role_set_id FROM member_roles)"
+                )
+                deleted += cursor.rowcount
+        return deleted
+
+    @instrumented
+    async def storage_report(self, guild_id: int | None = None) -> list[dict]:
+        query = """
+            SELECT m.guild_id, rs.role_ids, COUNT(*) AS members
+            FROM member_roles m
+            JOIN role_sets rs ON rs.set_id = m.role_set_id
+        """
+        params = ()
+        if guild_id is not None:
+            query += " WHERE m.guild_id = ?"
+            params = (guild_id,)
+        query += " GROUP BY m.guild_id, m.role_set_id"
+
+        shards = [self.db.shard_for(guild_id)] if guild_id is not None else range(self.db.shards)
+        report = {}
+        for shard in shards:
+            async with self.db.read(shard=shard) as db:
+                cursor = await db.execute(query, params)
+                async for row in cursor:
+                    entry = report.setdefault(row['guild_id'], {
+                        'guild_id': row['guild_id'],
+                        'members': 0,
+                        'role_sets': 0,
+                        'json_bytes': 0,
+                        'packed_bytes': 0,
+                    })
+                    blob = row['role_ids']
+                    entry['members'] += row['members']
+                    entry['role_sets'] += 1
+                    entry['json_bytes'] += json_size(unpack_role_ids(blob)) * row['members']
+                    entry['packed_bytes'] += len(blob) + SET_REFERENCE_SIZE * (row['members'] + 1)
+
+        for entry in report.values():
+            entry['saved_bytes'] = entry['json_bytes'] - entry['packed_bytes']
+        return sorted(report.values(), key=lambda entry: entry['saved_bytes'], reverse=True)
+
+class RoleBackupRepository(Repository):
+    name = "backups"
+
+    def __init__(self, db, retention: int = 5):
+        super().__init__(db)
+        self.retention = max(1, retention)
+
+    @instrumented
+    async def save(self, guild_id: int, user_id: int, roles_data: list[dict]) -> int | None:
+        hashes = [backup_role_hash(guild_id, role_data) for role_data in roles_data]
+
+        try:
+            async with self.db.write(guild_id) as db:
+                cursor = await db.execute(
+                    "INSERT INTO backup_snapshots (guild_id, created_by, role_count) VALUES (?, ?, ?)",
+                    (guild_id, user_id, len(roles_data))
+                )
+                snapshot_id = cursor.lastrowid
+
+                await db.executemany(
+                    f"""
+                    INSERT OR IGNORE INTO backup_roles
+                    (role_hash, guild_id, {', '.join(BACKUP_ROLE_FIELDS)})
+                    VALUES (?, ?, {','.join(['?'] * len(BACKUP_ROLE_FIELDS))})
+                    """,
+                    [
+                        (role_hash, guild_id, *(role_data.get(field) for field in BACKUP_ROLE_FIELDS))
+                        for role_hash, role_data in zip(hashes, roles_data)
+                    ]
+                )
+                await db.executemany(
+                    "INSERT OR IGNORE INTO backup_snapshot_roles (snapshot_id, role_hash) VALUES (?, ?)",
+                    [(snapshot_id, role_hash) for role_hash in hashes]
+                )
+
+                await self._enforce_retention(db, guild_id)
+                return snapshot_id
+        except Exception as e:
+            logger.error(f"Error saving role backup: {e}")
+            return None
+
+    async def _enforce_retention(self, db, guild_id):
+        cursor = await db.execute(
+            """
+            SELECT snapshot_id FROM backup_snapshots
+            WHERE guild_id = ?
+            ORDER BY created_at DESC, snapshot_id DESC
+            LIMIT -1 OFFSET ?
+            """,
+            (guild_id, self.retention)
+        )
+        expired = [row[0] for row in await cursor.fetchall()]
+        if expired:
+            await self._delete_snapshots(db, guild_id, expired)
+
+    async def _delete_snapshots(self, db, guild_id, snapshot_ids):
+        placeholders = ','.join(['?'] * len(snapshot_ids))
+        await db.execute(
+            f"DELETE FROM backup_snapshot_roles WHERE snapshot_id IN ({placeholders})",
+            snapshot_ids
+        )
+        cursor = await db.execute(
+            f"DELETE FROM backup_snapshots WHERE guild_id = ? AND snapshot_id IN ({placeholders})",
+            (guild_id, *snapshot_ids)
+        )
+        await db.execute(
+            """
+            DELETE FROM backup_roles
+            WHERE guild_id = ? AND role_hash NOT IN (
+                SELECT sr.role_hash
+                FROM backup_snapshot_roles sr
+                JOIN backup_snapshots s ON s.snapshot_id = sr.snapshot_id
+                WHERE s.guild_id = ?
+            )
+            """,
+            (guild_id, guild_id)
+        )
+        return cursor.rowcount
+
+    async def _find_snapshot(self, db, guild_id, snapshot_id=None):
+        if snapshot_id is None:
+            cursor = await db.execute(
+                """
+                SELECT snapshot_id, guild_id, created_by, created_at, role_count
+                FROM backup_snapshots
+                WHERE guild_id = ?
+                ORDER BY created_at DESC, snapshot_id DESC
+                LIMIT 1
+                """,
+                (guild_id,)
+            )
+        else:
+            cursor = await db.execute(
+                """
+                SELECT snapshot_id, guild_id, created_by, created_at, role_count
+                FROM backup_snapshots
+                WHERE guild_id = ? AND snapshot_id = ?
+                """,
+                (guild_id, snapshot_id)
+            )
+        return await cursor.fetchone()
+
+    @instrumented
+    async def exists(self, guild_id: int, snapshot_id: int | None = None) -> bool:
+        try:
+            async with self.db.read(guild_id) as db:
+                return await self._find_snapshot(db, guild_id, snapshot_id) is not None
+        except Exception as e:
+            logger.error(f"Error checking if backup exists: {e}")
+            return False
+
+    @instrumented
+    async def count(self, guild_id: int) -> int:
+        async with self.db.read(guild_id) as db:
+            cursor = await db.execute(
+                "SELECT COUNT(*) FROM backup_snapshots WHERE guild_id = ?",
+                (guild_id,)
+            )
+            result = await cursor.fetchone()
+            return result[0]
+
+    @instrumented
+    async def list_snapshots(self, guild_id: int) -> list[dict]:
+        try:
+            async with self.db.read(guild_id) as db:
+                cursor = await db.execute(
+                    """
+                    SELECT snapshot_id, created_by, created_at, role_count
+                    FROM backup_snapshots
+                    WHERE guild_id = ?
+                    ORDER BY created_at DESC, snapshot_id DESC
+                    """,
+                    (guild_id,)
+                )
+                return [dict(row) for row in await cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error listing role backups: {e}")
+            return []
+
+    @instrumented
+    async def get(self, guild_id: int, snapshot_id: int | None = None) -> dict | None:
+        try:
+            async with self.db.read(guild_id) as db:
+                snapshot = await self._find_snapshot(db, guild_id, snapshot_id)
+
+                if not snapshot:
+                    return None
+
+                cursor = await db.execute(
+                    f"""
+                    SELECT {', '.join('r.' + field for field in BACKUP_ROLE_FIELDS)}
+                    FROM backup_snapshot_roles sr
+                    JOIN backup_roles r ON r.role_hash = sr.role_hash
+                    WHERE sr.snapshot_id = ?
+                    ORDER BY r.position, r.id
+                    """,
+                    (snapshot['snapshot_id'],)
+                )
+                roles_data = [
+                    {
+                        **dict(row),
+                        'hoist': bool(row['hoist']),
+                        'mentionable': bool(row['mentionable'])
+                    }
+                    for row in await cursor.fetchall()
+                ]
+
+                return {
+                    'snapshot_id': snapshot['snapshot_id'],
+                    'guild_id': snapshot['guild_id'],
+                    'created_by': snapshot['created_by'],
+                    'created_at': snapshot['created_at'],
+                    'roles': roles_data
+                }
+        except Exception as e:
+            logger.error(f"Error getting role backup: {e}")
+            return None
+
+    @instrumented
+    async def delete(self, guild_id: int, snapshot_id: int | None = None) -> bool:
+        try:
+            async with self.db.write(guild_id) as db:
+                if snapshot_id is None:
+                    cursor = await db.execute(
+                        "SELECT snapshot_id FROM backup_snapshots WHERE guild_id = ?",
+                        (guild_id,)
+                    )
+                    snapshot_ids = [row[0] for row in await cursor.fetchall()]
+                else:
+                    snapshot_ids = [snapshot_id]
+
+                if not snapshot_ids:
+                    return False
+
+                return await self._delete_snapshots(db, guild_id, snapshot_ids) > 0
+        except Exception as e:
+            logger.error(f"Error deleting role backup: {e}")
+            return False
+
+class GuildRepository(Repository):
+    name = "guilds"
+
+    FEATURE_TABLES = ["autoroles", "statusroles", "guild_settings", "member_roles", "role_sets", "backup_snapshots", "backup_roles"]
+
+    @instrumented
+    async def remove_roles(self, guild_id: int, role_ids: list[int]) -> dict:
+        role_ids = set(role_ids)
+        if not role_ids:
+            return {}
+
+        placeholders = ','.join(['?'] * len(role_ids))
+        sticky = self.db.stickyroles
+        removed = {}
+
+        async with sticky.flush_lock:
+            for queue in (sticky.pending_member_roles, sticky.flushing_member_roles):
+                for key, (queued_role_ids, updated_at) in queue.items():
+                    if key[0] == guild_id and not role_ids.isdisjoint(queued_role_ids):
+                        queue[key] = ([role_id for role_id in queued_role_ids if role_id not in role_ids], updated_at)
+
+            async with self.db.write(guild_id) as db:
+                for repository in (self.db.autoroles, self.db.statusroles):
+                    cursor = await db.execute(
+                        f"DELETE FROM {repository.name} WHERE guild_id = ? AND role_id IN ({placeholders})",
+                        (guild_id, *role_ids)
+                    )
+                    removed[repository.name] = cursor.rowcount
+                    if cursor.rowcount:
+                        await self.record_change(db, guild_id, repository.name)
+
+                removed["member_roles"] = await self._remove_from_role_sets(db, guild_id, role_ids)
+
+        for repository in (self.db.autoroles, self.db.statusroles):
+            if removed[repository.name]:
+                self.cache.invalidate(repository.name, guild_id)
+        return removed
+
+    async def _remove_from_role_sets(self, db, guild_id: int, role_ids: set[int]) -> int:
+        cursor = await db.execute(
+            "SELECT set_id, role_ids FROM role_sets WHERE guild_id = ?",
+            (guild_id,)
+        )
+        updated = 0
+        for set_id, blob in await cursor.fetchall():
+            stored_role_ids = unpack_role_ids(blob)
+            if role_ids.isdisjoint(stored_role_ids):
+                continue
+
+            remaining = [role_id for role_id in stored_role_ids if role_id not in role_ids]
+            if remaining:
+                new_set_id, new_blob = intern_role_ids(guild_id, remaining)
+                await db.execute(
+                    "INSERT OR IGNORE INTO role_sets (set_id, guild_id, role_ids) VALUES (?, ?, ?)",
+                    (new_set_id, guild_id, new_blob)
+                )
+                members = await db.execute(
+                    "UPDATE member_roles SET role_set_id = ? WHERE guild_id = ? AND role_set_id = ?",
+                    (new_set_id, guild_id, set_id)
+                )
+            else:
+                members = await db.execute(
+                    "DELETE FROM member_roles WHERE guild_id = ? AND role_set_id = ?",
+                    (guild_id, set_id)
+                )
+            await db.execute("DELETE FROM role_sets WHERE set_id = ?", (set_id,))
+            updated += members.rowcount
+        return updated
+
+    @instrumented
+    async def summary(self, guild_id: int) -> dict:
+        async with self.db.read(guild_id) as db:
+            cursor = await db.execute(
+                """
+                SELECT
+                    (SELECT COUNT(*) FROM autoroles WHERE guild_id = :guild_id) AS autoroles,
+                    (SELECT COUNT(*) FROM statusroles WHERE guild_id = :guild_id) AS statusroles,
+                    (SELECT COALESCE(MAX(is_enabled), 0) FROM guild_settings WHERE guild_id = :guild_id) AS sticky_enabled,
+                    (SELECT COUNT(*) FROM member_roles WHERE guild_id = :guild_id) AS member_roles,
+                    (SELECT COUNT(*) FROM backup_snapshots WHERE guild_id = :guild_id) AS role_backups
+                """,
+                {"guild_id": guild_id}
+            )
+            result = await cursor.fetchone()
+            return dict(result)
+
+    @instrumented
+    async def known_guild_ids(self) -> set[int]:
+        guild_ids = set()
+        for shard in range(self.db.shards):
+            async with self.db.read(shard=shard) as db:
+                cursor = await db.execute(
+                    " UNION ".join(f"SELECT DISTINCT guild_id FROM {table}" for table in self.FEATURE_TABLES)
+                )
+                guild_ids.update(row[0] for row in await cursor.fetchall())
+        return guild_ids
+
+    @instrumented
+    async def schedule_purge(self, guild_id: int, purge_after: datetime) -> bool:
+        async with self.db.write(guild_id) as db:
+            cursor = await db.execute(
+                "INSERT OR IGNORE INTO pending_purges (guild_id, purge_after) VALUES (?, ?)",
+                (guild_id, purge_after.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            return cursor.rowcount > 0
+
+    @instrumented
+    async def cancel_purge(self, guild_id: int) -> bool:
+        async with self.db.write(guild_id) as db:
+            cursor = await db.execute(
+                "DELETE FROM pending_purges WHERE guild_id = ?",
+                (guild_id,)
+            )
+            return cursor.rowcount > 0
+
+    @instrumented
+    async def due_purges(self, now: datetime) -> list[int]:
+        now = now.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        guild_ids = []
+        for shard in range(self.db.shards):
+            async with self.db.read(shard=shard) as db:
+                cursor = await db.execute(
+                    "SELECT guild_id FROM pending_purges WHERE purge_after <= ?",
+                    (now,)
+                )
+                guild_ids.extend(row[0] for row in await cursor.fetchall())
+        return guild_ids
+
+    @instrumented
+    async def purge(self, guild_id: int) -> int:
+        sticky = self.db.stickyroles
+        async with sticky.flush_lock:
+            deleted = sticky.drop_pending(guild_id)
+
+            async with self.db.write(guild_id) as db:
+                await db.execute(
+                    """
+                    DELETE FROM backup_snapshot_roles
+                    WHERE snapshot_id IN (SELECT snapshot_id FROM backup_snapshots WHERE guild_id = ?)
+                    """,
+                    (guild_id,)
+                )
+                for table in self.FEATURE_TABLES:
+                    cursor = await db.execute(
+                        f"DELETE FROM {table} WHERE guild_id = ?",
+                        (guild_id,)
+                    )
+                    deleted += cursor.rowcount
+                await db.execute(
+                    "DELETE FROM pending_purges WHERE guild_id = ?",
+                    (guild_id,)
+                )
+                for repository in (self.db.autoroles, self.db.statusroles, sticky):
+                    await self.record_change(db, guild_id, repository.name)
+
+            self.cache.invalidate_guild(guild_id)
+            return deleted
@@ -0,0 +1,83 @@
+import discord
+from utils.logger import get_logger
+
+logger = get_logger("roleindex")
+
+class RoleIndex:
+    def __init__(self, bot: discord.Bot):
+        self.bot = bot
+        self.assignable = {}
+
+        for event in ("on_ready", "on_guild_join", "on_guild_available", "on_guild_remove",
+                      "on_guild_role_create", "on_guild_role_update", "on_guild_role_delete", "on_member_update"):
+            bot.add_listener(getattr(self, event), event)
+
+    def is_assignable(self, guild: discord.Guild, role: discord.Role) -> bool:
+        if role.is_default() or (role.tags is not None and role.tags.is_bot_managed()):
+            return False
+        return guild.me.top_role > role
+
+    def build(self, guild: discord.Guild) -> set[int]:
+        me = guild.me
+        if me is None or not me.guild_permissions.manage_roles:
+            role_ids = set()
+        else:
+            role_ids = {role.id for role in guild.roles if self.is_assignable(guild, role)}
+        self.assignable[guild.id] = role_ids
+        return role_ids
+
+    def assignable_ids(self, guild: discord.Guild) -> set[int]:
+        role_ids = self.assignable.get(guild.id)
+        if role_ids is None:
+            role_ids = self.build(guild)
+        return role_ids
+
+    def filter(self, guild: discord.Guild, role_ids) -> list[int]:
+        assignable = self.assignable_ids(guild)
+        return [role_id for role_id in role_ids if role_id in assignable]
+
+    async def on_ready(self):
+        self.assignable.clear()
+
+    async def on_guild_join(self, guild: discord.Guild):
+        self.build(guild)
+
+    async def on_guild_available(self, guild: discord.Guild):
+        self.build(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.assignable.pop(guild.id, None)
+
+    async def on_guild_role_create(self, role: discord.Role):
+        role_ids = self.assignable.get(role.guild.id)
+        if role_ids is not None and role.guild.me.guild_permissions.manage_roles and self.is_assignable(role.guild, role):
+            role_ids.add(role.id)
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        guild = after.guild
+        role_ids = self.assignable.get(guild.id)
+        if role_ids is None:
+            return
+
+        # Changes to the bot's own roles, to @everyone, to permissions or to the role order can affect every other role.
+        if (before.position != after.position or before.permissions != after.permissions
+                or after.is_default() or guild.me.get_role(after.id) is not None):
+            self.build(guild)
+        elif guild.me.guild_permissions.manage_roles and self.is_assignable(guild, after):
+            role_ids.add(after.id)
+        else:
+            role_ids.discard(after.id)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        role_ids = self.assignable.get(role.guild.id)
+        if role_ids is None:
+            return
+
+        if role.id in role_ids:
+            role_ids.discard(role.id)
+        else:
+            self.build(role.guild)
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if after.id == self.bot.user.id and before.roles != after.roles:
+            self.build(after.guild)
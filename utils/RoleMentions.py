@@ -0,0 +1,18 @@
+import re
+
+ROLE_TOKEN_PATTERN = re.compile(r"<@&(\d+)>|(\d+)|(\S+)")
+
+def parse_roles(guild, text):
+    roles = []
+    unknown = []
+    if not text:
+        return roles, unknown
+
+    for mention_id, raw_id, other in ROLE_TOKEN_PATTERN.findall(text.replace(",", " ")):
+        role = guild.get_role(int(mention_id or raw_id)) if (mention_id or raw_id) else None
+        if role is None:
+            unknown.append(other or mention_id or raw_id)
+        elif role not in roles:
+            roles.append(role)
+
+    return roles, unknown
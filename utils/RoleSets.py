@@ -0,0 +1,31 @@
+import hashlib
+import json
+import struct
+
+ROLE_ID_SIZE = 8
+SET_REFERENCE_SIZE = 8
+
+def pack_role_ids(role_ids):
+    role_ids = sorted(set(role_ids))
+    return struct.pack(f"<{len(role_ids)}q", *role_ids)
+
+def unpack_role_ids(blob):
+    return list(struct.unpack(f"<{len(blob) // ROLE_ID_SIZE}q", blob))
+
+def role_set_id(guild_id, blob):
+    digest = hashlib.blake2b(struct.pack("<q", guild_id) + blob, digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+def json_size(role_ids):
+    return len(json.dumps(role_ids))
+
+def intern_role_ids(guild_id, role_ids):
+    blob = pack_role_ids(role_ids)
+    return role_set_id(guild_id, blob), blob
+
+BACKUP_ROLE_FIELDS = ("id", "name", "color", "hoist", "position", "permissions", "mentionable")
+
+def backup_role_hash(guild_id, role_data):
+    canonical = json.dumps([guild_id] + [role_data.get(field) for field in BACKUP_ROLE_FIELDS], separators=(",", ":"))
+    digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
@@ -0,0 +1,136 @@
+import aiosqlite
+import argparse
+import asyncio
+import logging
+import os
+from utils.CacheSnapshot import snapshot_path
+from utils.DatabaseManager import shard_index, shard_paths
+from utils.Migrations import run_migrations, get_schema_version, MIGRATIONS
+
+logger = logging.getLogger("database")
+
+GUILD_TABLES = ["autoroles", "statusroles", "guild_settings", "member_roles", "role_sets", "backup_roles", "config_versions", "pending_purges"]
+
+async def copy_guild_table(source, targets, table, chunk_size):
+    cursor = await source.execute(f"SELECT * FROM {table}")
+    columns = [column[0] for column in cursor.description]
+    guild_column = columns.index("guild_id")
+    query = f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({','.join(['?'] * len(columns))})"
+    copied = 0
+
+    while True:
+        rows = await cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+
+        batches = {}
+        for row in rows:
+            batches.setdefault(shard_index(row[guild_column], len(targets)), []).append(tuple(row))
+
+        for index, batch in batches.items():
+            await targets[index].executemany(query, batch)
+            await targets[index].commit()
+        copied += len(rows)
+
+    return copied
+
+async def copy_backup_snapshots(source, targets, chunk_size):
+    cursor = await source.execute(
+        "SELECT snapshot_id, guild_id, created_by, created_at, role_count FROM backup_snapshots ORDER BY snapshot_id"
+    )
+    snapshot_ids = {}
+
+    for snapshot_id, guild_id, created_by, created_at, role_count in await cursor.fetchall():
+        index = shard_index(guild_id, len(targets))
+        inserted = await targets[index].execute(
+            "INSERT INTO backup_snapshots (guild_id, created_by, created_at, role_count) VALUES (?, ?, ?, ?)",
+            (guild_id, created_by, created_at, role_count)
+        )
+        snapshot_ids[snapshot_id] = (index, inserted.lastrowid)
+
+    for target in targets:
+        await target.commit()
+
+    cursor = await source.execute("SELECT snapshot_id, role_hash FROM backup_snapshot_roles")
+    while True:
+        rows = await cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+
+        batches = {}
+        for snapshot_id, role_hash in rows:
+            if snapshot_id not in snapshot_ids:
+                continue
+            index, new_snapshot_id = snapshot_ids[snapshot_id]
+            batches.setdefault(index, []).append((new_snapshot_id, role_hash))
+
+        for index, batch in batches.items():
+            await targets[index].executemany(
+                "INSERT OR IGNORE INTO backup_snapshot_roles (snapshot_id, role_hash) VALUES (?, ?)",
+                batch
+            )
+            await targets[index].commit()
+
+    return len(snapshot_ids)
+
+async def rebalance(source_path, source_shards, target_path, target_shards, chunk_size=5000):
+    sources = shard_paths(source_path, source_shards)
+    targets = shard_paths(target_path, target_shards)
+    latest_version = MIGRATIONS[-1][0]
+
+    for path in sources:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Source shard {path} does not exist")
+
+    for path in targets:
+        if os.path.exists(path):
+            raise FileExistsError(f"Target shard {path} already exists, refusing to overwrite it")
+
+    os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+    # A cache snapshot of the target describes whatever layout ran there before, not the data copied in now.
+    for path in {snapshot_path(source_path), snapshot_path(target_path)}:
+        if os.path.exists(path):
+            os.remove(path)
+            logger.info(f"Removed cache snapshot {path}")
+
+    target_connections = []
+    try:
+        for index, path in enumerate(targets):
+            target = await aiosqlite.connect(path)
+            target_connections.append(target)
+            await target.execute("PRAGMA journal_mode = WAL")
+            await run_migrations(target, path, lambda guild_id, index=index: shard_index(guild_id, target_shards) == index, import_legacy=False)
+
+        for path in sources:
+            async with aiosqlite.connect(path) as source:
+                version = await get_schema_version(source)
+                if version != latest_version:
+                    raise RuntimeError(f"Source shard {path} is at schema version {version}, expected {latest_version}. Start the bot once to migrate it first.")
+
+                for table in GUILD_TABLES:
+                    copied = await copy_guild_table(source, target_connections, table, chunk_size)
+                    logger.info(f"Copied {copied} rows of {table} from {path}")
+
+                copied = await copy_backup_snapshots(source, target_connections, chunk_size)
+                logger.info(f"Copied {copied} backup snapshots from {path}")
+    finally:
+        for target in target_connections:
+            await target.close()
+
+    return targets
+
+def main():
+    parser = argparse.ArgumentParser(description="Redistribute EzRoles data into a new number of guild shards.")
+    parser.add_argument("--source", default="database/ezroles.db", help="Base path of the current database")
+    parser.add_argument("--source-shards", type=int, default=1, help="Number of shards of the current database")
+    parser.add_argument("--target", default=None, help="Base path of the new database (defaults to --source)")
+    parser.add_argument("--shards", type=int, required=True, help="Number of shards to create")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows copied per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    targets = asyncio.run(rebalance(args.source, args.source_shards, args.target or args.source, args.shards, args.chunk_size))
+    logger.info(f"Rebalanced into {len(targets)} shard(s): {', '.join(targets)}. Set DATABASE_SHARDS={args.shards} to use them.")
+
+if __name__ == "__main__":
+    main()
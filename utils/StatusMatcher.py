@@ -0,0 +1,71 @@
+from collections import deque
+
+# Below this many patterns, one C-level substring search per pattern beats walking the automaton in Python.
+SCAN_LIMIT = 48
+
+class StatusMatcher:
+    """Aho-Corasick automaton over casefolded status texts, returning a bitmask of every pattern found."""
+
+    __slots__ = ("patterns", "goto", "fail", "out", "always")
+
+    def __init__(self, patterns=()):
+        self.patterns = tuple(pattern.casefold() for pattern in patterns)
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [0]
+        self.always = 0
+
+        if len(self.patterns) < SCAN_LIMIT:
+            return
+
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                # An empty text is contained in every status.
+                self.always |= 1 << index
+                continue
+
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(0)
+                node = next_node
+            self.out[node] |= 1 << index
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                # Patterns that end inside this one are reported here as well.
+                self.out[child] |= self.out[self.fail[child]]
+
+    def match(self, text: str | None) -> int:
+        if not text:
+            return 0
+
+        if len(self.patterns) < SCAN_LIMIT:
+            text = text.casefold()
+            mask = 0
+            for index, pattern in enumerate(self.patterns):
+                if pattern in text:
+                    mask |= 1 << index
+            return mask
+
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        mask = self.always
+        for char in text.casefold():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            mask |= out[node]
+        return mask
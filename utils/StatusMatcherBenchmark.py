@@ -0,0 +1,56 @@
+import argparse
+import random
+import string
+import timeit
+from utils.StatusMatcher import SCAN_LIMIT, StatusMatcher
+
+def scan(patterns, text):
+    text = text.casefold()
+    mask = 0
+    for index, pattern in enumerate(patterns):
+        if pattern in text:
+            mask |= 1 << index
+    return mask
+
+def random_words(rng, count):
+    return ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10))) for _ in range(count)]
+
+def random_statuses(rng, words, count):
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(1, 6))) + " ❤ Playing" for _ in range(count)]
+
+def check(rng, rounds):
+    # At least SCAN_LIMIT patterns, so every round goes through the automaton rather than the plain scan.
+    # Small alphabets make overlapping and nested patterns likely, which is where the automaton can go wrong.
+    for _ in range(rounds):
+        patterns = ["".join(rng.choice("abc") for _ in range(rng.randint(0, 4))) for _ in range(rng.randint(SCAN_LIMIT, SCAN_LIMIT * 2))]
+        text = "".join(rng.choice("abcABC") for _ in range(rng.randint(0, 12)))
+        expected = scan([pattern.casefold() for pattern in patterns], text) if text else 0
+        if StatusMatcher(patterns).match(text) != expected:
+            raise AssertionError(f"Mismatch for {patterns!r} in {text!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the status matcher against scanning every mapping.")
+    parser.add_argument("--mappings", type=int, nargs="+", default=[10, 32, 100, 300, 800], help="Mapping counts to measure")
+    parser.add_argument("--statuses", type=int, default=1000, help="Statuses matched per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs averaged per measurement")
+    parser.add_argument("--seed", type=int, default=2, help="Random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    check(rng, 3000)
+    print("Matcher agrees with a per-mapping scan")
+
+    words = random_words(rng, max(2000, max(args.mappings)))
+    statuses = random_statuses(rng, words, args.statuses)
+    calls = args.statuses * args.repeat
+    for count in args.mappings:
+        patterns = rng.sample(words, count)
+        matcher = StatusMatcher(patterns)
+        scanned = timeit.timeit(lambda: [scan(patterns, status) for status in statuses], number=args.repeat) / calls * 1e6
+        matched = timeit.timeit(lambda: [matcher.match(status) for status in statuses], number=args.repeat) / calls * 1e6
+        built = timeit.timeit(lambda: StatusMatcher(patterns), number=args.repeat) / args.repeat * 1e3
+        mode = "scan" if count < SCAN_LIMIT else "automaton"
+        print(f"mappings={count:5d} per-mapping scan={scanned:7.1f} us matcher ({mode})={matched:6.1f} us build={built:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
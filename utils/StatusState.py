@@ -0,0 +1,155 @@
+import heapq
+import time
+from utils.StatusMatcher import StatusMatcher
+
+class GuildStatusState:
+    """Which status mappings each member currently matches, as one int bitmask per matching member."""
+
+    __slots__ = ("guild_id", "due", "mappings", "role_ids", "mapped_role_ids", "matcher", "matches", "dirty", "primed")
+
+    def __init__(self, guild_id: int, due: list, mappings=()):
+        self.guild_id = guild_id
+        self.due = due
+        self.mappings = ()
+        self.role_ids = ()
+        self.mapped_role_ids = frozenset()
+        self.matcher = StatusMatcher()
+        self.matches = {}
+        self.dirty = {}
+        self.primed = False
+        self.compile(mappings)
+
+    def compile(self, mappings) -> bool:
+        mappings = tuple((role_id, status_text.casefold()) for role_id, status_text in mappings)
+        if mappings == self.mappings:
+            return False
+
+        # Bit positions follow the mapping order, so existing masks mean nothing after a change.
+        self.mappings = mappings
+        self.role_ids = tuple(role_id for role_id, _ in mappings)
+        self.mapped_role_ids = frozenset(self.role_ids)
+        self.matcher = StatusMatcher(status_text for _, status_text in mappings)
+        self.matches.clear()
+        self.primed = False
+        return True
+
+    def match(self, status: str | None) -> int:
+        return self.matcher.match(status)
+
+    def update(self, user_id: int, status: str | None, delay: float = 0.0) -> bool:
+        mask = self.match(status)
+        if mask:
+            previous = self.matches.get(user_id, 0)
+            self.matches[user_id] = mask
+        else:
+            previous = self.matches.pop(user_id, 0)
+
+        if mask == previous:
+            return False
+        # Every change pushes the member back, so only the state after a quiet period gets applied.
+        self.schedule(user_id, time.monotonic() + delay)
+        return True
+
+    def schedule(self, user_id: int, due_at: float):
+        # Earlier entries for the member stay in the heap and are skipped once dirty no longer matches them.
+        self.dirty[user_id] = due_at
+        heapq.heappush(self.due, (due_at, self.guild_id, user_id))
+
+    def mask(self, user_id: int) -> int:
+        return self.matches.get(user_id, 0)
+
+    def desired_roles(self, mask: int) -> set[int]:
+        role_ids = set()
+        index = 0
+        while mask:
+            if mask & 1:
+                role_ids.add(self.role_ids[index])
+            mask >>= 1
+            index += 1
+        return role_ids
+
+    def diff(self, user_id: int, current_role_ids) -> tuple[set[int], set[int]]:
+        # Several mappings can share a role; it stays as long as any of them matches.
+        desired = self.desired_roles(self.mask(user_id))
+        current = self.mapped_role_ids.intersection(current_role_ids or ())
+        return desired - current, current - desired
+
+    def needs_reconcile(self, user_id: int, current_role_ids, assignable) -> bool:
+        # Members already waiting for reconciliation are not new drift.
+        if user_id in self.dirty:
+            return False
+
+        # Roles the bot cannot assign would drift on every sweep and keep it at the shortest interval.
+        to_add, to_remove = self.diff(user_id, current_role_ids)
+        if (to_add | to_remove) & assignable:
+            self.schedule(user_id, time.monotonic())
+            return True
+        return False
+
+    def forget(self, user_id: int):
+        self.matches.pop(user_id, None)
+        self.dirty.pop(user_id, None)
+
+    def is_due(self, user_id: int, due_at: float) -> bool:
+        # A member rescheduled or forgotten since being taken is left to its newer entry.
+        return self.dirty.get(user_id) == due_at
+
+    def claim(self, user_id: int, due_at: float):
+        if self.is_due(user_id, due_at):
+            del self.dirty[user_id]
+
+
+class StatusState:
+    __slots__ = ("guilds", "due")
+
+    def __init__(self):
+        self.guilds = {}
+        self.due = []
+
+    def guild(self, guild_id: int, status_roles: list[dict]) -> GuildStatusState:
+        mappings = [(mapping['role_id'], mapping['status_text']) for mapping in status_roles]
+        state = self.guilds.get(guild_id)
+        if state is None:
+            state = self.guilds[guild_id] = GuildStatusState(guild_id, self.due, mappings)
+        else:
+            state.compile(mappings)
+        return state
+
+    def get(self, guild_id: int) -> GuildStatusState | None:
+        return self.guilds.get(guild_id)
+
+    def unprime(self, guild_id: int):
+        state = self.guilds.get(guild_id)
+        if state is not None:
+            state.primed = False
+
+    def drop(self, guild_id: int):
+        self.guilds.pop(guild_id, None)
+
+    def _is_current(self, due_at: float, guild_id: int, user_id: int) -> bool:
+        state = self.guilds.get(guild_id)
+        return state is not None and state.is_due(user_id, due_at)
+
+    def next_due(self) -> float | None:
+        while self.due and not self._is_current(*self.due[0]):
+            heapq.heappop(self.due)
+        return self.due[0][0] if self.due else None
+
+    def take_due(self, now: float, limit: int = 1000) -> dict[int, list[tuple[int, float]]]:
+        # Members stay dirty until they are reconciled, so a sweep in between does not count them as new drift.
+        # The limit keeps priming a large guild from popping everything in one go; the rest stays due.
+        due = {}
+        while self.due and self.due[0][0] <= now and limit:
+            due_at, guild_id, user_id = heapq.heappop(self.due)
+            if self._is_current(due_at, guild_id, user_id):
+                due.setdefault(guild_id, []).append((user_id, due_at))
+                limit -= 1
+        return due
+
+    def stats(self) -> dict:
+        return {
+            "guilds": len(self.guilds),
+            "matching_members": sum(len(state.matches) for state in self.guilds.values()),
+            "dirty_members": sum(len(state.dirty) for state in self.guilds.values()),
+            "scheduled_entries": len(self.due)
+        }
@@ -0,0 +1,58 @@
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from utils.StatusState import StatusState
+
+def measure(fill):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = fill()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0], kept
+    finally:
+        tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory of the status match state against a per-member dict.")
+    parser.add_argument("--members", type=int, default=100_000, help="Members in the synthetic guild")
+    parser.add_argument("--mappings", type=int, default=10, help="Status mappings in the guild")
+    parser.add_argument("--matching", type=float, default=0.5, help="Share of members whose status matches a mapping")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [f"word{index}x" for index in range(args.mappings * 2)]
+    statuses = {
+        10**17 + index: f"{rng.choice(texts[:args.mappings])} something" if rng.random() < args.matching else f"{rng.choice(texts[args.mappings:])} something"
+        for index in range(args.members)
+    }
+    mappings = [{'role_id': 1000 + index, 'status_text': text} for index, text in enumerate(texts[:args.mappings])]
+
+    def fill_state():
+        state = StatusState()
+        guild_state = state.guild(1, mappings)
+        for user_id, status in statuses.items():
+            guild_state.update(user_id, status)
+        # Priming schedules every changed member; what stays afterwards is the state once the reconcile has run.
+        for user_id, due_at in state.take_due(time.monotonic() + 1, limit=args.members).get(1, ()):
+            guild_state.claim(user_id, due_at)
+        return guild_state
+
+    def fill_dict():
+        return {
+            user_id: {mapping['role_id']: mapping['status_text'] in status.lower() for mapping in mappings}
+            for user_id, status in statuses.items()
+        }
+
+    compact, guild_state = measure(fill_state)
+    naive, _ = measure(fill_dict)
+    print(
+        f"members={args.members} mappings={args.mappings} matching={len(guild_state.matches)} "
+        f"bitmask state={compact / 2**20:.2f} MiB per-member dict state={naive / 2**20:.2f} MiB"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import random
+
+class SweepScheduler:
+    """Spreads per-guild verification sweeps over time and adapts each guild's interval to how often it drifts."""
+
+    def __init__(self, interval=3600.0, min_interval=None, max_interval=None, jitter=0.1):
+        self.interval = interval
+        self.min_interval = min_interval if min_interval is not None else interval / 4
+        self.max_interval = max_interval if max_interval is not None else interval * 4
+        self.jitter = jitter
+        self.next_run = {}
+        self.intervals = {}
+        self.running = set()
+        self.requested = set()
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self.next_run or guild_id in self.running
+
+    def add(self, guild_id: int, now: float):
+        # New guilds land anywhere in the first interval, so a restart does not sweep everything at once.
+        self.next_run[guild_id] = now + random.uniform(0, self.intervals.get(guild_id, self.interval))
+
+    def request(self, guild_id: int, now: float):
+        # Bursts of configuration changes collapse into one sweep, run with the regular ones.
+        if guild_id in self.running:
+            self.requested.add(guild_id)
+        else:
+            self.next_run[guild_id] = min(self.next_run.get(guild_id, now), now)
+
+    def take_due(self, now: float) -> list[int]:
+        due = sorted((due_at, guild_id) for guild_id, due_at in self.next_run.items() if due_at <= now)
+        for _, guild_id in due:
+            del self.next_run[guild_id]
+            self.running.add(guild_id)
+        return [guild_id for _, guild_id in due]
+
+    def done(self, guild_id: int, now: float, drifted: int):
+        self.running.discard(guild_id)
+
+        # Drift means events are being missed, so look sooner; a clean sweep backs off.
+        interval = self.intervals.get(guild_id, self.interval)
+        if drifted:
+            interval = max(self.min_interval, interval / 2)
+        else:
+            interval = min(self.max_interval, interval * 1.5)
+        self.intervals[guild_id] = interval
+        if guild_id in self.requested:
+            # The sweep that just finished may have read the configuration from before the change.
+            self.requested.discard(guild_id)
+            self.next_run[guild_id] = now
+        else:
+            self.next_run[guild_id] = now + interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def forget(self, guild_id: int):
+        self.next_run.pop(guild_id, None)
+        self.intervals.pop(guild_id, None)
+        self.running.discard(guild_id)
+        self.requested.discard(guild_id)
+
+    def stats(self) -> dict:
+        intervals = self.intervals.values()
+        return {
+            "scheduled": len(self.next_run),
+            "running": len(self.running),
+            "min_interval": min(intervals, default=self.interval),
+            "max_interval": max(intervals, default=self.interval)
+        }